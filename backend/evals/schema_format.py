@@ -0,0 +1,177 @@
+"""
+Offline check of the schema formats: prompt size and whether questions stay answerable.
+
+Builds a small shop database in SQLite (with the usual audit and ETL columns), serializes it in every
+schema format and reports the tokens of the schema and of the whole DBA prompt. Then a stub DBA answers a
+fixed question set: it returns the reference SQL only if every column the question needs is visible in the
+schema it was given, which is the best any model can do with that context. The SQL is checked by static
+analysis and its rows are compared with the reference ones.
+
+    cd backend
+    python -m evals.schema_format
+"""
+import argparse
+import json
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import MetaData, create_engine
+from src.agent.prompts import DEVELOPER_AGENT_PROMPT
+from src.core.sql_analysis import analyze_sql, SQLAnalysisError
+from src.core.constants import DEFAULT_OMIT_PATTERNS
+from src.indexer.schema_format import SCHEMA_FORMATS, build_schema_catalog, format_schema
+
+SCHEMA = """
+CREATE TABLE customers (
+    id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, email VARCHAR(255), country VARCHAR(64),
+    created_at TIMESTAMP, created_by VARCHAR(64), updated_at TIMESTAMP, updated_by VARCHAR(64),
+    etl_batch_id INTEGER, row_version INTEGER
+);
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, category VARCHAR(64), price NUMERIC(10, 2),
+    created_at TIMESTAMP, updated_at TIMESTAMP, etl_batch_id INTEGER
+);
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY, customer_id INTEGER NOT NULL REFERENCES customers(id), status VARCHAR(16),
+    ordered_at TIMESTAMP, total NUMERIC(12, 2),
+    created_at TIMESTAMP, updated_at TIMESTAMP, updated_by VARCHAR(64), etl_batch_id INTEGER
+);
+CREATE TABLE order_items (
+    id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL REFERENCES orders(id),
+    product_id INTEGER NOT NULL REFERENCES products(id), quantity INTEGER, unit_price NUMERIC(10, 2),
+    _loaded_at TIMESTAMP
+);
+"""
+
+DATA = """
+INSERT INTO customers VALUES
+    (1, 'Aigerim', 'a@example.com', 'Kazakhstan', '2024-01-03', 'import', '2024-05-01', 'crm', 7, 3),
+    (2, 'Ben', 'b@example.com', 'Germany', '2024-02-11', 'import', '2024-02-11', 'import', 7, 1),
+    (3, 'Chloe', NULL, 'France', '2024-03-20', 'signup', '2024-06-02', 'crm', 8, 2);
+INSERT INTO products VALUES
+    (1, 'Keyboard', 'hardware', 49.90, '2023-12-01', '2024-04-01', 7),
+    (2, 'Monitor', 'hardware', 199.00, '2023-12-01', '2023-12-01', 7),
+    (3, 'IDE license', 'software', 89.00, '2024-01-15', '2024-06-01', 8);
+INSERT INTO orders VALUES
+    (1, 1, 'paid', '2024-04-02', 248.90, '2024-04-02', '2024-04-03', 'billing', 7),
+    (2, 2, 'refunded', '2024-04-10', 89.00, '2024-04-10', '2024-05-20', 'support', 7),
+    (3, 1, 'paid', '2024-05-15', 99.80, '2024-05-15', '2024-05-15', 'billing', 8),
+    (4, 3, 'shipped', '2024-06-01', 199.00, '2024-06-01', '2024-06-05', 'warehouse', 8);
+INSERT INTO order_items VALUES
+    (1, 1, 1, 1, 49.90, '2024-04-03'), (2, 1, 2, 1, 199.00, '2024-04-03'),
+    (3, 2, 3, 1, 89.00, '2024-04-11'), (4, 3, 1, 2, 49.90, '2024-05-16'),
+    (5, 4, 2, 1, 199.00, '2024-06-02');
+"""
+
+# (question, reference SQL, columns it needs as table.column)
+QUESTIONS: List[Tuple[str, str, List[str]]] = [
+    ("How many customers are there per country?",
+     "SELECT country, COUNT(*) AS customers FROM customers GROUP BY country ORDER BY country",
+     ["customers.country"]),
+    ("What is the revenue of paid orders?",
+     "SELECT SUM(total) AS revenue FROM orders WHERE status = 'paid'",
+     ["orders.total", "orders.status"]),
+    ("Which products were sold most by quantity?",
+     "SELECT p.title, SUM(i.quantity) AS sold FROM order_items i JOIN products p ON p.id = i.product_id "
+     "GROUP BY p.title ORDER BY sold DESC, p.title",
+     ["order_items.quantity", "order_items.product_id", "products.title", "products.id"]),
+    ("Revenue per customer name?",
+     "SELECT c.name, SUM(o.total) AS revenue FROM orders o JOIN customers c ON c.id = o.customer_id "
+     "GROUP BY c.name ORDER BY c.name",
+     ["customers.name", "customers.id", "orders.total", "orders.customer_id"]),
+    ("How many orders were placed in May 2024?",
+     "SELECT COUNT(*) AS orders FROM orders WHERE ordered_at >= '2024-05-01' AND ordered_at < '2024-06-01'",
+     ["orders.ordered_at"]),
+    ("Average unit price per product category?",
+     "SELECT p.category, AVG(i.unit_price) AS avg_price FROM order_items i JOIN products p ON p.id = i.product_id "
+     "GROUP BY p.category ORDER BY p.category",
+     ["order_items.unit_price", "order_items.product_id", "products.category", "products.id"]),
+    ("Which customers signed up in 2024 and have no email?",
+     "SELECT name FROM customers WHERE created_at >= '2024-01-01' AND email IS NULL",
+     ["customers.name", "customers.created_at", "customers.email"]),
+    ("Which orders were changed after they were placed, and by whom?",
+     "SELECT id, updated_by FROM orders WHERE updated_at > ordered_at ORDER BY id",
+     ["orders.id", "orders.updated_by", "orders.updated_at", "orders.ordered_at"]),
+]
+
+
+def _token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return "cl100k_base", lambda text: len(encoding.encode(text))
+    except ImportError:
+        return "approximate (chars / 4)", lambda text: len(text) // 4
+
+
+def _table_section(schema_context: str, table: str) -> Optional[str]:
+    """The part of the schema context describing `table`, in any of the formats."""
+    verbose = re.search(rf"^Table name: {table}\n(.*?)(?:\n\n|\Z)", schema_context, re.MULTILINE | re.DOTALL)
+    if verbose:
+        return verbose.group(1)
+    compact = re.search(rf"^{table}\((.*)\)$", schema_context, re.MULTILINE)
+    return compact.group(1) if compact else None
+
+
+def stub_dba(schema_context: str, reference_sql: str, needed_columns: List[str]) -> dict:
+    """Answers like the DBA agent, with the reference SQL if everything it needs is in the schema context."""
+    for needed in needed_columns:
+        table, column = needed.split(".")
+        section = _table_section(schema_context, table)
+        if section is None or not re.search(rf"\b{column}\b", section):
+            return {"mismatch": f"{needed} is not in the schema."}
+    return {"sql_query": reference_sql}
+
+
+def evaluate(schema_format: str, metadata: MetaData, conn: sqlite3.Connection, omit_patterns: List[str],
+             count_tokens) -> Dict:
+    schema_context = format_schema(metadata, schema_format, omit_patterns)
+    catalog = build_schema_catalog(metadata)
+    prompt = DEVELOPER_AGENT_PROMPT.format(system_time="2024-07-01T00:00:00", requirements="", dialect="sqlite",
+                                           schema=schema_context, value_profiles="none", previous_steps_errors=None)
+    failures = []
+    for question, reference_sql, needed_columns in QUESTIONS:
+        payload = stub_dba(schema_context, reference_sql, needed_columns)
+        if "mismatch" in payload:
+            failures.append({"question": question, "reason": payload["mismatch"]})
+            continue
+        try:
+            analyze_sql(payload["sql_query"], "sqlite", catalog)
+        except SQLAnalysisError as e:
+            failures.append({"question": question, "reason": str(e)})
+            continue
+        if conn.execute(payload["sql_query"]).fetchall() != conn.execute(reference_sql).fetchall():
+            failures.append({"question": question, "reason": "different rows"})
+    return {
+        "schema_tokens": count_tokens(schema_context),
+        "prompt_tokens": count_tokens(prompt),
+        "accuracy": round(1 - len(failures) / len(QUESTIONS), 3),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--omit", nargs="*", default=list(DEFAULT_OMIT_PATTERNS),
+                        help="patterns of columns left out of the compact format")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA + DATA)
+    engine = create_engine("sqlite://", creator=lambda: conn)
+    metadata = MetaData()
+    metadata.reflect(bind=engine)
+
+    tokenizer, count_tokens = _token_counter()
+    results = {schema_format: evaluate(schema_format, metadata, conn, args.omit, count_tokens)
+               for schema_format in SCHEMA_FORMATS}
+    baseline = results["verbose"]
+    for result in results.values():
+        result["schema_token_reduction"] = round(1 - result["schema_tokens"] / baseline["schema_tokens"], 3)
+        result["prompt_token_reduction"] = round(1 - result["prompt_tokens"] / baseline["prompt_tokens"], 3)
+    print(json.dumps({"tokenizer": tokenizer, "questions": len(QUESTIONS), "formats": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Load test of one backend instance against stubbed LLMs and a local SQLite database.
+
+Starts `loadtest.stub_app:app` with uvicorn (optionally with several workers) and drives it with
+virtual users. Each user initializes a conversation (`use_test_db`), asks `--chats` questions
+alternating non-streaming and streaming chat, one of them needing a web search (served by
+`loadtest.stub_search:app`), and runs the generated SQL through `/sql`.
+
+    cd backend
+    python -m loadtest.run --users 200 --concurrency 50 --workers 2 --llm-median-ms 800
+
+Reports throughput, latency percentiles per endpoint, time to first token of streamed answers
+and error rates. LLM latency is configured with the --llm-* options, see loadtest/stub_app.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.ttft = []
+
+    def record(self, operation: str, started: float, ok: bool):
+        if ok:
+            self.latencies[operation].append(time.perf_counter() - started)
+        else:
+            self.errors[operation] += 1
+
+    def report(self, wall_seconds: float) -> dict:
+        operations = sorted(set(self.latencies) | set(self.errors))
+        total = sum(len(v) for v in self.latencies.values()) + sum(self.errors.values())
+        result = {"wall_seconds": round(wall_seconds, 2), "requests": total,
+                  "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else None, "operations": {}}
+        for operation in operations:
+            latencies = self.latencies[operation]
+            count = len(latencies) + self.errors[operation]
+            result["operations"][operation] = {
+                "count": count,
+                "error_rate": round(self.errors[operation] / count, 4),
+                **{f"p{int(q * 100)}_ms": None if _percentile(latencies, q) is None
+                   else round(_percentile(latencies, q) * 1000, 1) for q in (0.5, 0.95, 0.99)},
+            }
+        result["stream_ttft_ms"] = {f"p{int(q * 100)}": None if _percentile(self.ttft, q) is None
+                                    else round(_percentile(self.ttft, q) * 1000, 1) for q in (0.5, 0.95, 0.99)}
+        return result
+
+
+async def _virtual_user(client: httpx.AsyncClient, recorder: Recorder, chats: int):
+    started = time.perf_counter()
+    try:
+        response = await client.post("/v1/conversation/init", params={"use_test_db": "true"}, json={})
+        response.raise_for_status()
+        thread_id = response.json()["thread_id"]
+        recorder.record("init", started, True)
+    except Exception:
+        recorder.record("init", started, False)
+        return
+
+    sql_query = None
+    for i in range(chats):
+        if i == chats - 1:  # the same for all users, mostly served from the search cache
+            question = {"role": "user", "content": "What are the latest retail trends in Germany?"}
+        elif i == 1:  # two DBA calls in one turn
+            question = {"role": "user", "content": "Please compare customers per country and orders per country."}
+        else:
+            question = {"role": "user", "content": f"How many customers are in each country? ({i})"}
+        started = time.perf_counter()
+        if i % 2 == 0:
+            try:
+                response = await client.post(f"/v1/conversation/{thread_id}", json=question)
+                response.raise_for_status()
+                sql_query = response.json()["data"][0].get("sql_query") or sql_query
+                recorder.record("chat", started, True)
+            except Exception:
+                recorder.record("chat", started, False)
+            continue
+        ok, first_token = True, None
+        try:
+            async with client.stream("POST", f"/v1/conversation/{thread_id}", params={"stream": "true"},
+                                     json=question) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event["event"] == "content" and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event["event"] == "sql_query":
+                        sql_query = event["data"]
+                    elif event["event"] == "error":
+                        ok = False
+        except Exception:
+            ok = False
+        recorder.record("chat_stream", started, ok)
+        if ok and first_token is not None:
+            recorder.ttft.append(first_token)
+
+    if sql_query:
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"/v1/conversation/{thread_id}/sql", json={"query": sql_query})
+            response.raise_for_status()
+            recorder.record("sql", started, True)
+        except Exception:
+            recorder.record("sql", started, False)
+
+
+async def _drive(base_url: str, users: int, concurrency: int, chats: int, timeout: float) -> dict:
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def run_user():
+            async with semaphore:
+                await _virtual_user(client, recorder, chats)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user() for _ in range(users)))
+        report = recorder.report(time.perf_counter() - started)
+        report["backend_metrics"] = (await client.get("/v1/metrics")).json()  # of one worker
+        return report
+
+
+def _start_server(app: str, port: int, workers: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server of {url} exited during startup.")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server of {url} didn't start in time.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="virtual users in total")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users active at the same time")
+    parser.add_argument("--chats", type=int, default=4, help="questions per user, every other one is streamed")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--llm-median-ms", type=float, default=800)
+    parser.add_argument("--llm-sigma", type=float, default=0.5)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--search-ms", type=float, default=300, help="latency of the stub search server")
+    parser.add_argument("--db-rows", type=int, default=10_000)
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request, seconds")
+    parser.add_argument("--data-dir", default=None, help="where the stub app keeps its state (default: temp dir)")
+    parser.add_argument("--output", default=None, help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="nl2sql-loadtest-")
+    port, search_port = _free_port(), _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    search_url = f"http://127.0.0.1:{search_port}"
+    env = {
+        **os.environ,
+        "WEB_SEARCH_URL": search_url,
+        "LOADTEST_SEARCH_MS": str(args.search_ms),
+        "LOADTEST_DATA_DIR": data_dir,
+        "LOADTEST_LLM_MEDIAN_MS": str(args.llm_median_ms),
+        "LOADTEST_LLM_SIGMA": str(args.llm_sigma),
+        "LOADTEST_TOKEN_MS": str(args.token_ms),
+        "LOADTEST_TEST_DB_ROWS": str(args.db_rows),
+    }
+    search_process = _start_server("loadtest.stub_search:app", search_port, 1, env)
+    process = _start_server("loadtest.stub_app:app", port, args.workers, env)
+    try:
+        _wait_until_up(f"{search_url}/stats", search_process)
+        _wait_until_up(f"{base_url}/v1/test", process)
+        report = asyncio.run(_drive(base_url, args.users, args.concurrency, args.chats, args.timeout))
+        report["search_server"] = httpx.get(f"{search_url}/stats").json()
+    finally:
+        for p in (process, search_process):
+            p.terminate()
+            p.wait(timeout=30)
+
+    report["settings"] = {k: v for k, v in vars(args).items() if k != "output"}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
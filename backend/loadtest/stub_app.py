@@ -0,0 +1,187 @@
+"""
+The backend app with stubbed LLMs, embeddings and a local SQLite test database, for load tests.
+
+Run it like the real app: `uvicorn loadtest.stub_app:app --workers 4`.
+Latency of the stub LLM calls is log-normal, configured with environment variables:
+- LOADTEST_LLM_MEDIAN_MS (default 800) and LOADTEST_LLM_SIGMA (default 0.5) for a whole response,
+- LOADTEST_TOKEN_MS (default 15) between streamed tokens,
+- LOADTEST_TEST_DB_ROWS (default 10000) rows in the test database.
+Set EMBEDDING_MODEL=local to index with the local embeddings instead of stub vectors.
+Questions with "latest" call `search_web`, run `loadtest.stub_search:app` and set WEB_SEARCH_URL to it.
+Everything is stored in LOADTEST_DATA_DIR (default: a `loadtest_data` directory next to this file).
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+DATA_DIR = Path(os.getenv("LOADTEST_DATA_DIR", Path(__file__).parent / "loadtest_data")).resolve()
+TEST_DB_PATH = DATA_DIR / "test_db.sqlite"
+
+# must be set before anything imports src.core.config
+for key, value in {
+    "ENV": "dev",
+    "PORT": "8000",
+    "OPENAI_API_KEY": "stub",
+    "CEREBRAS_API_KEY": "stub",
+    "JINA_API_KEY": "stub",
+    "TEST_DB_ENGINE": "sqlite",
+    "TEST_DB_HOST": "localhost",
+    "TEST_DB_PORT": "0",
+    "TEST_DB_USERNAME": "stub",
+    "TEST_DB_PASSWORD": "stub",
+    "TEST_DB_NAME": str(TEST_DB_PATH),
+    "LANGFUSE_HOST": "http://127.0.0.1:9",
+    "LANGFUSE_PUBLIC_KEY": "stub",
+    "LANGFUSE_SECRET_KEY": "stub",
+    "LANGFUSE_BATCH_SIZE": "100",
+    "DATA_DIR": str(DATA_DIR),
+}.items():
+    os.environ.setdefault(key, value)
+
+import numpy as np  # noqa: E402
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings  # noqa: E402
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult  # noqa: E402
+
+LLM_MEDIAN_MS = float(os.getenv("LOADTEST_LLM_MEDIAN_MS", 800))
+LLM_SIGMA = float(os.getenv("LOADTEST_LLM_SIGMA", 0.5))
+TOKEN_MS = float(os.getenv("LOADTEST_TOKEN_MS", 15))
+TEST_DB_ROWS = int(os.getenv("LOADTEST_TEST_DB_ROWS", 10_000))
+
+STUB_SQL = "SELECT country, COUNT(*) AS customers FROM customers GROUP BY country ORDER BY customers DESC"
+STUB_ANSWER = ("Most customers are in the first country of the list, followed by the others in descending order. "
+               "The distribution is fairly even, so no single market dominates.")
+
+
+def _sleep_latency(share: float = 1.0):
+    time.sleep(share * random.lognormvariate(math.log(LLM_MEDIAN_MS / 1000), LLM_SIGMA))
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Plays both agents: searches the web for questions about "latest" things and asks the DBA for SQL
+    otherwise (twice to "compare" something) when it has tools, answers after a tool result,
+    returns fixed SQL in JSON mode (DBA) and a fixed text otherwise (schema summaries).
+    """
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        if kwargs.get("response_format"):
+            return AIMessage(content=json.dumps({"sql_query": STUB_SQL}))
+        if kwargs.get("tools") and isinstance(messages[-1], HumanMessage) and "latest" in messages[-1].content:
+            return AIMessage(content="", tool_calls=[{
+                "name": "search_web",
+                "args": {"query": messages[-1].content},
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+            }])
+        if kwargs.get("tools") and isinstance(messages[-1], HumanMessage):
+            parts = 2 if "compare" in messages[-1].content else 1  # independent calls run in parallel
+            return AIMessage(content="", tool_calls=[{
+                "name": "delegate_to_database_administrator",
+                "args": {"sql_query_requirements": f"Count customers per country. Question: {messages[-1].content}"},
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+            } for _ in range(parts)])
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content=STUB_ANSWER)
+        return AIMessage(content="Stub summary of the test database: customers and their orders.")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        _sleep_latency()
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, **kwargs))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = self._respond(messages, **kwargs)
+        _sleep_latency(share=0.5)  # time to first token
+        if response.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                for i, tc in enumerate(response.tool_calls)
+            ]))
+            return
+        for token in response.content.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+            time.sleep(TOKEN_MS / 1000)
+
+
+class StubEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Deterministic pseudo-random vector per text, identical in every worker."""
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [
+            np.random.default_rng(int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little"))
+            .random(64, dtype=np.float32)
+            for text in input
+        ]
+
+
+def _create_test_db():
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    if TEST_DB_PATH.exists():
+        return
+    tmp_path = TEST_DB_PATH.with_suffix(f".{os.getpid()}.tmp")  # workers may race, last rename wins
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript("""
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT NOT NULL, country TEXT NOT NULL);
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER NOT NULL REFERENCES customers(id),
+            amount NUMERIC(10, 2) NOT NULL,
+            status TEXT NOT NULL,
+            created_at DATE NOT NULL
+        );
+    """)
+    countries = ["Germany", "France", "United States", "Kazakhstan", "Japan", "Brazil"]
+    customers = TEST_DB_ROWS // 10 or 1
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?)",
+                     [(i, f"Customer {i}", countries[i % len(countries)]) for i in range(customers)])
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", [
+        (i, i % customers, round(random.uniform(5, 500), 2), random.choice(["paid", "shipped", "refunded"]),
+         f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}")
+        for i in range(TEST_DB_ROWS)
+    ])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, TEST_DB_PATH)
+
+
+class _NoopCallbackHandler(BaseCallbackHandler):
+    pass
+
+
+_create_test_db()
+
+from src.core import embeddings, llms  # noqa: E402
+
+for model_key in llms.models:
+    llms.models[model_key] = StubChatModel()
+if embeddings.config.embedding_model != "local":
+    embeddings._embedding_function_cache = embeddings.CachedEmbeddingFunction(
+        StubEmbeddingFunction(),
+        model_name="loadtest-stub",
+        path=embeddings.config.resolve_path(embeddings.config.embedding_cache_path),
+        max_entries=embeddings.config.embedding_cache_max_entries,
+        batch_size=embeddings.config.embedding_batch_size,
+    )
+
+from src.api import routes  # noqa: E402
+
+routes.langfuse_handler = _NoopCallbackHandler()  # no tracing backend in load tests
+
+from main import app  # noqa: E402, F401
@@ -0,0 +1,32 @@
+"""
+Stub of the s.jina.ai search API for load tests, point `WEB_SEARCH_URL` to it.
+
+    uvicorn loadtest.stub_search:app --port 8100
+
+Answers after LOADTEST_SEARCH_MS (default 300) and counts the requests it got at `/stats`.
+"""
+import asyncio
+import os
+
+from fastapi import FastAPI
+
+SEARCH_MS = float(os.getenv("LOADTEST_SEARCH_MS", 300))
+
+app = FastAPI()
+stats = {"requests": 0}
+
+
+@app.get("/")
+async def search(q: str):
+    stats["requests"] += 1
+    await asyncio.sleep(SEARCH_MS / 1000)
+    return {"code": 200, "data": [
+        {"title": f"Result {i} for {q}", "url": f"https://example.com/{i}",
+         "description": f"Stub search result {i} about {q}.", "date": "2025-01-01"}
+        for i in range(5)
+    ]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
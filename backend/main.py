@@ -1,10 +1,26 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from src.api import routes
+from src.api.profiling import profile_requests
+from src.core.admission import AdmissionRejected
+from src.core.config import config
+from src.core.profiling import profiling_enabled
+from src.core.web_search import web_search_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await asyncio.to_thread(web_search_client.close)
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -22,5 +38,20 @@ app.add_middleware(
 
 app.include_router(routes.router)
 
+if profiling_enabled():  # not even the middleware when profiling is off.
+    app.middleware("http")(profile_requests)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        {"detail": {"error": "Service is busy, please retry in a few seconds."}},
+        status_code=503,
+        headers={"Retry-After": "5"},
+    )
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="localhost", port=8000)
+    if config.workers > 1:  # workers are separate processes, uvicorn needs an import string for them.
+        uvicorn.run("main:app", host="localhost", port=8000, workers=config.workers)
+    else:
+        uvicorn.run(app, host="localhost", port=8000)
@@ -13,6 +13,9 @@ from langgraph.config import get_config
 class Configuration:
     """The configuration for the agent."""
     model: str = "default"
+    use_llm_cache: bool = True  # per-request switch to bypass the LLM response cache.
+    keep_results: bool = True  # keep query results in the thread's local workspace for follow-ups.
+    preview: bool = False  # run queries over samples of the tables for a fast approximate answer.
 
     @classmethod
     def from_context(cls) -> Configuration:
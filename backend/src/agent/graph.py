@@ -1,28 +1,49 @@
-import sqlite3
-
 from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.constants import END
 from langgraph.graph import StateGraph, START
-from langgraph.prebuilt import ToolNode
 from src.agent.nodes.agent_nodes import *
-from src.agent.nodes.util_nodes import route_llm, init_node, init_condition
+from src.agent.nodes.router_nodes import router_node, fast_path_node
+from src.agent.nodes.util_nodes import route_llm, init_node, init_condition, create_parallel_tool_node
 from src.agent.state import State
+from src.core.config import config
+from src.core.db import connect_sqlite
 from src.core.utils import generate_uuid
 
-conn = sqlite3.connect("checkpoints.sqlite", check_same_thread=False)
-checkpointer = SqliteSaver(conn)
+
+def _create_checkpointer():
+    """
+    Each worker process gets its own connection. SQLite in WAL mode is fine for a few workers on one host,
+    Postgres is for anything bigger or multiple hosts.
+    """
+    if config.checkpoint_backend == "postgres":
+        try:
+            from langgraph.checkpoint.postgres import PostgresSaver
+            from psycopg import Connection
+        except ImportError:
+            raise ImportError("The 'langgraph-checkpoint-postgres' library is required. "
+                              "Please install it with 'pip install langgraph-checkpoint-postgres'.")
+        postgres_conn = Connection.connect(config.checkpoint_postgres_uri, autocommit=True, prepare_threshold=0)
+        saver = PostgresSaver(postgres_conn)
+        saver.setup()
+        return saver
+    return SqliteSaver(connect_sqlite(config.resolve_path(config.checkpoint_path)))
+
+
+checkpointer = _create_checkpointer()
 builder = StateGraph(State)
 
 builder.add_node("init_node", init_node)
+builder.add_node("router", router_node, destinations=("fast_path", "business_analyst"))
+builder.add_node("fast_path", fast_path_node, destinations=("business_analyst", END))
 builder.add_node("business_analyst", business_analyst_node)
-builder.add_node("business_analyst_tools", ToolNode(ba_tools))
+builder.add_node("business_analyst_tools", create_parallel_tool_node(ba_tools, config.tool_calls_max_parallel))
 builder.add_edge("business_analyst_tools", "business_analyst")
 builder.add_node("database_administrator", delegate_to_database_administrator)
 
 # builder.add_node("blockchain_input", blockchain_input)
 
 builder.add_edge(START, "init_node")
-builder.add_conditional_edges("init_node", init_condition, ["business_analyst", END])
+builder.add_conditional_edges("init_node", init_condition, ["router", END])
 
 builder.add_conditional_edges(
     "business_analyst",
@@ -31,3 +52,5 @@ builder.add_conditional_edges(
 )  # developer agent seems to be a separate tool, rather than next step?
 
 graph = builder.compile(checkpointer=checkpointer)
+# runs one-off questions (batch API) from a given state, nothing is persisted.
+stateless_graph = builder.compile()
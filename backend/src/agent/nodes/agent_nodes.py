@@ -4,11 +4,15 @@ When there is a lot of tools that can be grouped together, or a tool is too big
 (like tax calculators or staking calculators), only then separate agent is being made.
 """
 
+import time
+
 from langchain_core.messages import AIMessage
 
+from src.agent.nodes.router_nodes import record_analyst_call
 from src.agent.prompts import BUSINESS_REQUIREMENTS_DEFINER_PROMPT
 from src.agent.tools import *
 from src.core.llms import get_llm
+from src.core.workspace import result_workspace
 
 
 def business_analyst_node(state: State, config: RunnableConfig) -> Dict[str, List[AIMessage]]:
@@ -17,11 +21,14 @@ def business_analyst_node(state: State, config: RunnableConfig) -> Dict[str, Lis
     system_message = SystemMessage(content=BUSINESS_REQUIREMENTS_DEFINER_PROMPT.format(
         system_time=datetime.now().isoformat(),
         schema=database_schema_context,
+        previous_results=result_workspace.describe(config["configurable"]["thread_id"]),
     ))
     llm = get_llm().bind_tools(ba_tools)
 
     messages = filter_messages(state.messages)
+    started = time.monotonic()
     response = llm.invoke([system_message] + messages)
+    record_analyst_call(time.monotonic() - started)
     return {
         "messages": [response],
     }
@@ -0,0 +1,170 @@
+"""
+Fast path for simple questions.
+
+The router scores the question with cheap lexical rules. Simple lookups ("how many customers in Germany")
+go straight to SQL generation and are answered with a template, skipping both business analyst hops.
+Everything else, and fast path failures, go to the business analyst.
+Decisions are recorded with their outcome and the latency saved, so the threshold can be tuned.
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Literal, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langgraph.config import get_stream_writer
+from langgraph.constants import END
+from langgraph.types import Command
+from src.agent.state import State
+from src.agent.tools.tools import run_database_administrator
+from src.core.config import config
+from src.core.utils import get_message_text
+
+logger = logging.getLogger(__name__)
+
+_SIMPLE_OPENING = re.compile(
+    r"^(how many|how much|what is the (total|number|count|sum|average|maximum|minimum)|what are the top|"
+    r"count|list|show|give me|which|who)\b", re.IGNORECASE)
+_COMPLEX_TERMS = re.compile(
+    r"\b(compare|comparison|versus|vs|why|explain|trends?|correlat\w*|forecast\w*|predict\w*|recommend\w*|"
+    r"insights?|analy[sz]\w*|impact|causes?|latest|news)\b", re.IGNORECASE)
+# follow-ups that only make sense with the conversation, the analyst resolves them.
+_REFERENCES = re.compile(
+    r"^(and|but|also|what about|how about)\b|\b(it|they|them|that|this|those|these|previous|above|same)\b",
+    re.IGNORECASE)
+# tools whose results a later question may build on
+_QUERY_TOOLS = ("delegate_to_database_administrator", "query_previous_results")
+
+_stats_lock = threading.Lock()
+router_stats = {
+    "simple": 0,
+    "complex": 0,
+    "fast_path_answered": 0,
+    "fast_path_fallbacks": 0,
+    "fast_path_seconds_wasted": 0.0,  # spent on the fast path before falling back
+    # a fast answer saves both analyst hops, estimated with the average analyst call observed so far.
+    "estimated_seconds_saved": 0.0,
+    "analyst_calls": 0,
+    "analyst_seconds_total": 0.0,
+}
+_recent_decisions = deque(maxlen=200)
+
+
+def classify_question(question: str) -> (float, Dict[str, Any]):
+    """Score of how simple the question is, and the features it is made of."""
+    words = question.split()
+    features = {
+        "words": len(words),
+        "simple_opening": bool(_SIMPLE_OPENING.match(question.strip())),
+        "complex_terms": len(_COMPLEX_TERMS.findall(question)),
+        "references": len(_REFERENCES.findall(question.strip())),
+        "clauses": len(re.findall(r",|;|\band\b|\bor\b", question, re.IGNORECASE)),
+    }
+    score = (
+        1.0 * features["simple_opening"]
+        - 1.0 * features["complex_terms"]
+        - 1.0 * features["references"]
+        - 0.5 * max(0, features["clauses"] - 1)
+        - 0.1 * max(0, features["words"] - config.fast_path_max_words)
+    )
+    return score, features
+
+
+def record_analyst_call(seconds: float):
+    with _stats_lock:
+        router_stats["analyst_calls"] += 1
+        router_stats["analyst_seconds_total"] += seconds
+
+
+def _record(decision: Dict[str, Any], outcome: str, seconds: Optional[float] = None):
+    decision = {**decision, "outcome": outcome, "seconds": None if seconds is None else round(seconds, 3)}
+    with _stats_lock:
+        if outcome == "answered":
+            router_stats["fast_path_answered"] += 1
+            if router_stats["analyst_calls"]:
+                router_stats["estimated_seconds_saved"] += \
+                    2 * router_stats["analyst_seconds_total"] / router_stats["analyst_calls"]
+        elif outcome == "fallback":
+            router_stats["fast_path_fallbacks"] += 1
+            router_stats["fast_path_seconds_wasted"] += seconds or 0.0
+        _recent_decisions.append(decision)
+    logger.info("Router decision: %s", decision)
+
+
+def router_snapshot() -> Dict[str, Any]:
+    with _stats_lock:
+        return {**router_stats, "recent": list(_recent_decisions)}
+
+
+def _has_previous_query(messages: List[BaseMessage]) -> bool:
+    """Whether an earlier turn ran a query, the question may then refer to it without saying so."""
+    return any(
+        isinstance(message, AIMessage) and (
+            message.name == "fast_path" or any(call["name"] in _QUERY_TOOLS for call in message.tool_calls))
+        for message in messages
+    )
+
+
+def router_node(state: State) -> Command[Literal["fast_path", "business_analyst"]]:
+    question = get_message_text(state.messages[-1])
+    score, features = classify_question(question)
+    # the fast path doesn't see the conversation, follow-ups need the analyst.
+    features["previous_query"] = _has_previous_query(state.messages[:-1])
+    simple = config.fast_path_enabled and score >= config.fast_path_threshold and not features["previous_query"]
+    with _stats_lock:
+        router_stats["simple" if simple else "complex"] += 1
+    decision = {"score": score, "features": features, "route": "fast_path" if simple else "business_analyst"}
+    if not simple:
+        _record(decision, "routed")
+        return Command(goto="business_analyst")
+    return Command(goto="fast_path", update={"route_decision": decision})
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    return "—" if value is None else str(value)
+
+
+def format_direct_answer(rows: List[Dict[str, Any]], approximation: Optional[Dict[str, Any]]) -> str:
+    """Answer without an LLM: a single value, a single record or a table of the first rows."""
+    if not rows:
+        answer = "No matching data was found."
+    elif len(rows) == 1 and len(rows[0]) == 1:
+        column, value = next(iter(rows[0].items()))
+        answer = f"{column.replace('_', ' ').capitalize()}: **{_format_value(value)}**"
+    elif len(rows) == 1:
+        answer = "\n".join(f"- {column.replace('_', ' ')}: {_format_value(value)}" for column, value in rows[0].items())
+    else:
+        columns = list(rows[0])
+        shown = rows[:config.fast_path_answer_max_rows]
+        lines = [f"Found {len(rows)} rows:", "",
+                 "| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+        lines += ["| " + " | ".join(_format_value(row.get(c)) for c in columns) + " |" for row in shown]
+        if len(rows) > len(shown):
+            lines += ["", f"...and {len(rows) - len(shown)} more rows."]
+        answer = "\n".join(lines)
+    if approximation:
+        answer += f"\n\n_Approximate: {approximation['note']}_"
+    return answer
+
+
+def fast_path_node(state: State) -> Command[Literal["business_analyst", "__end__"]]:
+    decision = state.route_decision or {}
+    started = time.monotonic()
+    writer = get_stream_writer()
+    result = run_database_administrator(state, get_message_text(state.messages[-1]), writer)
+    if isinstance(result, str):  # the analyst may still make sense of the question
+        _record(decision, "fallback", time.monotonic() - started)
+        return Command(goto="business_analyst", update={"route_decision": None})
+
+    payload = result.pop("payload")
+    answer = format_direct_answer(payload["query_results"], result["query_approximation"])
+    writer({"content": answer})  # not generated by an LLM, the API skips this node in the `messages` stream
+    _record(decision, "answered", time.monotonic() - started)
+    return Command(goto=END, update={**result, "route_decision": None,
+                                     "messages": [AIMessage(content=answer, name="fast_path")]})
@@ -7,7 +7,9 @@ from langchain_core.runnables import RunnableLambda, RunnableConfig
 from langgraph.config import get_stream_writer
 from langgraph.constants import END
 from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.types import Command
 from src.agent.state import State
+from src.core.admission import AdmissionRejected
 from src.core.config import config
 from src.core.models import SQLUpdate
 
@@ -27,6 +29,16 @@ def handle_tool_error(state) -> dict:
     }
 
 
+def format_tool_error(e: Exception) -> str:
+    """
+    `handle_tool_errors` of the parallel tool node: errors go back to the model as the tool result,
+    admission rejections propagate so the API can answer 503.
+    """
+    if isinstance(e, AdmissionRejected):
+        raise e
+    return f"Error: {repr(e)}\n Please fix your mistakes."
+
+
 def create_tool_node_with_masking_and_fallback(tools: list):
     tool_node = ToolNode(tools).with_fallbacks(
         [RunnableLambda(handle_tool_error)]
@@ -61,6 +73,31 @@ def create_tool_node_with_masking_and_fallback(tools: list):
     return RunnableLambda(run)
 
 
+def create_parallel_tool_node(tools: list, max_parallel: int):
+    """
+    Runs the tool calls of one message concurrently, at most `max_parallel` at a time.
+    Updates are merged in the order of the calls, as if they ran one after another:
+    messages are concatenated and the later call wins for other keys (`sql_query`, `query_results`).
+    """
+    tool_node = ToolNode(tools, handle_tool_errors=format_tool_error)
+
+    def run(state: State, config: RunnableConfig):
+        outputs = tool_node.invoke(state, config={**config, "max_concurrency": max_parallel})
+        if isinstance(outputs, dict):  # no tool returned a Command
+            return outputs
+        merged = {"messages": []}
+        for output in outputs:  # in the order of the tool calls
+            update = output.update if isinstance(output, Command) else output
+            for key, value in update.items():
+                if key == "messages":
+                    merged["messages"].extend(value)
+                else:
+                    merged[key] = value
+        return merged
+
+    return RunnableLambda(run)
+
+
 def filter_messages(messages: List) -> list:
     # todo: can make filtering of messages that always repeat:
     # - host agent mid instructions - can be deleted after fist occurrence
@@ -99,7 +136,8 @@ def route_to_workflow(state: State):  # might be useful for swarm
 def init_node(state: State, config: RunnableConfig):
     return {
         "sql_query": None,
-        "query_results": None
+        "query_results": None,
+        "query_approximation": None,
     }
 
 
@@ -109,8 +147,9 @@ def init_condition(state: State, config: RunnableConfig):
 
     state.sql_query = None
     state.query_results = None
+    state.query_approximation = None
     # state.messages = []
-    return "business_analyst"
+    return "router"
     # return Command(
     #     update=SQLUpdate(**{"sql_query": None, "query_results": None}),
     #     goto="business_analyst"
@@ -40,6 +40,11 @@ Goal: Find the top 5 customers by total spending.
 7. Limit the result to the top 5 customers.
 ```
 These instructions MUST go to the developer, but not back to the user. USER NEVER SHOULD SEE THOSE.
+
+Results of previous queries in this conversation are kept in local SQLite tables:
+{{previous_results}}
+If the user only refines those results (filter, sort, limit, aggregate them) and all needed columns are there,
+call `query_previous_results` with a SQLite query over these tables instead of delegating to the developer.
 If developer database administrator is asking for more details, provide if you know them.
 Otherwise, if building a query requires more details, clarify from the user.
 
@@ -58,6 +63,9 @@ You will be given:
 The database schema is as follows:
 {{schema}}
 
+Known values of columns in the relevant tables (sampled, use these exact literals in filters):
+{{value_profiles}}
+
 The business requirements are:
 "{{requirements}}"
 
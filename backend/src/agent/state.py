@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from typing import Sequence, Optional, Any, List
+from typing import Sequence, Optional, Any, List, Dict
 
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
@@ -18,8 +18,11 @@ class State(BaseModel):
     database_uri: str
     database_dialect: str
     schema_context: str
+    schema_catalog: Dict[str, Dict[str, str]] = Field(default_factory=dict)  # table -> column -> type
     sql_query: Optional[str] = Field(default=None)
     query_results: Optional[List[Any]] = Field(default=None)
+    query_approximation: Optional[Dict[str, Any]] = Field(default=None)  # set if query_results are a preview
+    route_decision: Optional[Dict[str, Any]] = Field(default=None)  # router -> fast path, for recording
 
     model_config = ConfigDict(validate_assignment=True)
 
@@ -1,4 +1,4 @@
 from .tools import *
 
-ba_tools = [delegate_to_database_administrator, search_web]
+ba_tools = [delegate_to_database_administrator, query_previous_results, search_web]
 dba_tools = []
@@ -1,27 +1,38 @@
 import logging
+import re
+import sqlite3
+import time
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Any, Optional, Union
 
-from httpx import AsyncClient
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool, InjectedToolCallId
 from langfuse import Langfuse
 from langgraph.config import get_stream_writer
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.prebuilt import InjectedState
 from langgraph.types import Command
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from src.agent.configuration import Configuration
 from src.agent.nodes.util_nodes import filter_messages
 from src.agent.prompts import DEVELOPER_AGENT_PROMPT
 from src.agent.state import State
+from src.core.admission import AdmissionRejected, db_limiter, current_thread_id
 from src.core.config import config
+from src.core.db import get_engine
+from src.core.json_stream import JSONFieldStream
 from src.core.llms import get_llm
 from src.core.models import SQLUpdate
+from src.core.preview import Preview, preview_sql
+from src.core.sql_analysis import analyze_sql, record_failed_round_trip, SQLAnalysisError
 from src.core.utils import normalize_sql_rows
-from src.core.utils import run_async
 from src.core.vector_store import *
-from src.core.vector_store import query_collection
-from src.indexer.index import SCHEMA_COLLECTION_NAME
+from src.core.web_search import web_search_client
+from src.core.workspace import result_workspace
+from src.core.vector_store import search_schema, get_thread_collection_name, get_value_profiles
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +41,7 @@ langfuse = Langfuse(public_key=config.langfuse_public_key, secret_key=config.lan
 
 
 @tool("search_web", parse_docstring=True)
-async def search_web(state: Annotated[State, InjectedState], query: str):
+def search_web(state: Annotated[State, InjectedState], query: str):
     """
     Search your own knowledge base for latest information.
     Make search query to be optimized for searching and include everything that search engine needs to know to return \
@@ -43,29 +54,7 @@ async def search_web(state: Annotated[State, InjectedState], query: str):
         dict: search results
 
     """
-    # can also use country to suit the results for the locale of the user.
-    async with AsyncClient(timeout=3) as client:
-        response = await client.get(
-            url="https://s.jina.ai",
-            params={
-                "q": query,
-                # "gl": "JP" # location # has limited list though
-                # "hl": "kz" # language # has limited list too.
-            },
-            headers={
-                "Authorization": f"Bearer {config.jina_api_key}",
-                "Accept": "application/json",
-                "X-Respond-With": "no-content",
-            }
-        )
-        try:
-            response.raise_for_status()
-        except Exception as e:
-            logger.exception(e)
-    search_results = response.json()['data']
-    if search_results is None:
-        return []
-    return [{"description": r['description'], "date": r.get('date', "no date")} for r in search_results]
+    return web_search_client.search_sync(query)
 
 
 @tool
@@ -87,28 +76,121 @@ def search_knowledge_base(state: Annotated[State, InjectedState], query: str, ev
     return {
         "notice": "rely more on the internal knowledge, than on web results if you have any interlap of topics.",
         "internal_knowledge": internal_kb_results,
-        "web_search_results": run_async(search_web(query))
+        "web_search_results": web_search_client.search_sync(query)
     }
 
 
-@tool("delegate_to_database_administrator", parse_docstring=True)
-def delegate_to_database_administrator(tool_call_id: Annotated[str, InjectedToolCallId],
-                                       state: Annotated[State, InjectedState], runnable_config: RunnableConfig,
-                                       sql_query_requirements: str) -> Dict[str, Dict]:
+def _value_profiles_for(requirements: str) -> str:
+    """Value profiles of the tables mentioned in the requirements."""
+    if not config.schema_profiling_enabled:
+        return "none"
+    collection_name = get_thread_collection_name(current_thread_id())
+    if collection_name is None:
+        return "none"
+    table_keys = set()
+    for identifier in re.findall(r"[A-Za-z_][\w$.]*", requirements):
+        identifier = identifier.lower().strip(".")
+        table_keys.add(identifier)
+        table_keys.update(identifier.split("."))
+    profiles = get_value_profiles(collection_name, sorted(table_keys))
+    return "\n\n".join(profiles.values()) or "none"
+
+
+def _call_writer(tool_call_id: str):
+    """Stream writer that tags events with the tool call, so results of parallel calls can be told apart."""
+    writer = get_stream_writer()
+    return lambda event: writer({**event, "tool_call_id": tool_call_id})
+
+
+class _SQLDeltaHandler(BaseCallbackHandler):
+    """Parses the DBA's JSON while it's generated and emits new SQL text as `sql_query_delta` events."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.sql = JSONFieldStream("sql_query")
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        delta = self.sql.feed(token)
+        if delta:
+            self.writer({"sql_query_delta": delta})
+
+    def finish(self, sql: str):
+        """Emits what wasn't streamed, all of it for cached or non-streaming responses."""
+        if sql.startswith(self.sql.value) and len(sql) > len(self.sql.value):
+            self.writer({"sql_query_delta": sql[len(self.sql.value):]})
+
+    def discard(self, reason: str):
+        """The streamed SQL won't run, a new attempt streams from scratch."""
+        self.writer({"sql_query_discarded": reason})
+        self.sql = JSONFieldStream("sql_query")
+
+
+def _dba_llm(use_llm_cache: bool, sql_stream: _SQLDeltaHandler):
     """
-    Delegate to database administrator agent to create an SQL to match the needs of users.
+    The DBA model in JSON mode. Its SQL is sent to the client as `sql_query_delta` events while it's generated:
+    `stream=True` streams it in every graph stream mode. Tagged `nostream`, so the JSON doesn't reach
+    the `messages` stream as answer tokens.
+    """
+    return get_llm(model_key=config.dba_llm_model, cache=use_llm_cache).with_structured_output(
+        method="json_mode", stream=True).with_config(callbacks=[sql_stream], tags=[TAG_NOSTREAM])
 
-    Args:
-        sql_query_requirements (str): Compiled requirements to what SQL query should be generated.
 
-    Returns:
-        Either reason why it couldn't make an SQL query or SQL query itself.
+def _stream_query_results(conn, sql: str, writer, started: float, preview: Optional[Preview] = None) -> list:
+    """
+    Executes `sql` (or its `preview`) with a server-side cursor and emits the rows as `query_results_chunk` events
+    while they are fetched, followed by a `query_results_done` event with the row count and timings.
+    Returns all rows.
+    """
+    result = conn.execution_options(stream_results=True).execute(text(preview.sql if preview else sql))
+    writer({"sql_query": sql})  # the database accepted the query.
+    if preview:
+        writer({"approximate": preview.info})
+    rows = []
+    first_row_ms = None
+    try:
+        for partition in result.mappings().partitions(config.query_results_chunk_rows):
+            chunk = normalize_sql_rows(partition)
+            if first_row_ms is None:
+                first_row_ms = round((time.monotonic() - started) * 1000)
+            writer({"query_results_chunk": chunk})
+            rows.extend(chunk)
+    except Exception as e:
+        writer({"query_results_aborted": str(e)})  # chunks sent so far are invalid, a retry follows.
+        raise
+    writer({"query_results_done": {
+        "row_count": len(rows),
+        "first_row_ms": first_row_ms,
+        "total_ms": round((time.monotonic() - started) * 1000),
+    }})
+    return rows
+
+
+def _run_query(conn, sql: str, engine: str, writer, started: float, preview: Optional[Preview]):
+    """Runs `sql` or its preview, a native sample falls back to a bounded scan if the table can't be sampled."""
+    if preview is not None and preview.method == "tablesample":
+        try:
+            return _stream_query_results(conn, sql, writer, started, preview), preview
+        except DBAPIError:
+            conn.rollback()  # views, ClickHouse tables without a sampling key
+            preview = preview_sql(sql, engine, config.preview_sample_percent, config.preview_max_scan_rows,
+                                  bounded=True)
+    return _stream_query_results(conn, sql, writer, started, preview), preview
+
+
+def run_database_administrator(state: State, sql_query_requirements: str, writer) -> Union[str, Dict[str, Any]]:
+    """
+    Generates SQL for the requirements, checks and runs it, retrying with the errors.
+    Returns the reason on failure, otherwise the state update (`sql_query`, `query_results`,
+    `query_approximation`) and the DBA's `payload` with the results.
     """
     database_uri = state.database_uri
 
     dialect = state.database_dialect
-    engine = create_engine(database_uri)
+    engine = get_engine(database_uri)
     database_schema = state.schema_context
+    configuration = Configuration.from_context()
+    use_llm_cache = configuration.use_llm_cache
+    value_profiles = _value_profiles_for(sql_query_requirements)
     error = None
     for _ in range(config.sql_generation_max_iterations):
         system_message = SystemMessage(content=DEVELOPER_AGENT_PROMPT.format(
@@ -116,39 +198,113 @@ def delegate_to_database_administrator(tool_call_id: Annotated[str, InjectedTool
             requirements=sql_query_requirements,
             dialect=dialect,
             schema=database_schema,
+            value_profiles=value_profiles,
             previous_steps_errors=error
         ))
 
-        llm = get_llm(stream=False).bind_tools([]).with_structured_output(method="json_mode")
+        sql_stream = _SQLDeltaHandler(writer)
         messages = filter_messages(state.messages)
-        payload = llm.invoke([system_message] + messages)
+        payload = _dba_llm(use_llm_cache, sql_stream).invoke([system_message] + messages)
 
         if payload.get('mismatch'):
             return f"Failed to generate SQL query, response from DBA: {payload['mismatch']}"
 
         sql = payload.get('sql_query')
+        if not sql:
+            error = "Response contained neither `sql_query` nor `mismatch`."
+            sql_stream.discard(error)
+            continue
+        sql_stream.finish(sql)
+        try:
+            analyze_sql(sql, dialect, state.schema_catalog)
+        except SQLAnalysisError as e:
+            error = f"{e} (found by static analysis, the query was not executed)"
+            sql_stream.discard(error)
+            continue
+        preview = None
+        if configuration.preview:
+            preview = preview_sql(sql, dialect, config.preview_sample_percent, config.preview_max_scan_rows)
+        started = time.monotonic()
         try:
-            with engine.connect() as conn:
-                result = conn.execute(text(sql))
-                rows = result.mappings().all()
-                rows = normalize_sql_rows(rows)
+            with db_limiter(database_uri).acquire(current_thread_id()), engine.connect() as conn:
+                rows, preview = _run_query(conn, sql, dialect, writer, started, preview)
+        except AdmissionRejected:
+            raise
         except Exception as e:
+            record_failed_round_trip(time.monotonic() - started)
             error = str(e)
+            sql_stream.discard(error)
             continue
-        writer = get_stream_writer()
-        writer({"sql_query": sql})
-        writer({"query_results": rows})
+        if configuration.keep_results and preview is None:  # samples would mislead follow-up questions
+            result_workspace.save(current_thread_id(), sql, rows)
         payload.update({"query_results": rows})
-        state.sql_query = sql
-        state.query_results = rows
-        state.messages = [ToolMessage(content=payload, tool_call_id=tool_call_id)]
-        return Command(
-            update=state,
-        )
+        if preview is not None:
+            payload["approximate"] = preview.info
+        return {
+            "sql_query": sql,
+            "query_results": rows,
+            "query_approximation": preview.info if preview else None,
+            "payload": payload,
+        }
 
     return "Sorry, DBA couldn't generate a valid query for your request"
 
 
+@tool("delegate_to_database_administrator", parse_docstring=True)
+def delegate_to_database_administrator(tool_call_id: Annotated[str, InjectedToolCallId],
+                                       state: Annotated[State, InjectedState], runnable_config: RunnableConfig,
+                                       sql_query_requirements: str) -> Dict[str, Dict]:
+    """
+    Delegate to database administrator agent to create an SQL to match the needs of users.
+
+    Args:
+        sql_query_requirements (str): Compiled requirements to what SQL query should be generated.
+
+    Returns:
+        Either reason why it couldn't make an SQL query or SQL query itself.
+    """
+    result = run_database_administrator(state, sql_query_requirements, _call_writer(tool_call_id))
+    if isinstance(result, str):
+        return result
+    payload = result.pop("payload")
+    # only the changed keys, calls of the same turn may run in parallel on the same state.
+    return Command(update={
+        **result,
+        "messages": [ToolMessage(content=payload, tool_call_id=tool_call_id)],
+    })
+
+
+@tool("query_previous_results", parse_docstring=True)
+def query_previous_results(tool_call_id: Annotated[str, InjectedToolCallId],
+                           state: Annotated[State, InjectedState], sql_query: str):
+    """
+    Refine results of previous queries of this conversation (filter, sort, top-N, aggregate them)
+    with a SQLite query over the local result tables, without touching the user's database.
+    Only use it when all needed data is already in those tables.
+
+    Args:
+        sql_query (str): SQLite SELECT query over the previous result tables.
+
+    Returns:
+        Result rows, or an error to fix the query or to delegate to database administrator instead.
+    """
+    started = time.monotonic()
+    try:
+        rows = result_workspace.query(current_thread_id(), sql_query)
+    except (LookupError, sqlite3.Error) as e:
+        return f"Failed to query previous results: {e}"
+    writer = _call_writer(tool_call_id)
+    writer({"workspace_query": sql_query})
+    writer({"query_results_chunk": rows})
+    writer({"query_results_done": {"row_count": len(rows), "first_row_ms": None,
+                                   "total_ms": round((time.monotonic() - started) * 1000)}})
+    return Command(update={
+        "query_results": rows,
+        "messages": [ToolMessage(content={"workspace_query": sql_query, "query_results": rows},
+                                 tool_call_id=tool_call_id)],
+    })
+
+
 @tool
 def retrieve_schema_details(query: str, thread_id: str) -> str:
     """
@@ -161,17 +317,27 @@ def retrieve_schema_details(query: str, thread_id: str) -> str:
     - "Show me details about the 'orders' table."
     - "What is the relationship between the users and orders tables?"
     """
+    collection_name = get_thread_collection_name(thread_id)
+    if collection_name is None:
+        return "No relevant schema details found for that query."
 
-    results = query_collection(
-        collection_name=SCHEMA_COLLECTION_NAME,
-        query_texts=[query],
-        thread_id=thread_id,
-        n_results=3  # Return the top 3 most relevant schema parts
+    tables = search_schema(
+        collection_name=collection_name,
+        query=query,
+        n_tables=config.schema_search_max_tables,
+        n_columns=config.schema_search_max_columns,
+        budget_ms=config.schema_search_budget_ms,
     )
 
-    if not results or not results.get("documents"):
+    if not tables:
         return "No relevant schema details found for that query."
 
-    # Format the results into a single string for the LLM
-    context_str = "\n---\n".join(results["documents"][0])
+    # Format the results into a single string for the LLM, wide tables only with their relevant columns
+    parts = []
+    for table in tables:
+        if table["document"]:
+            parts.append(table["document"])
+        else:
+            parts.append(f"Table name: {table['table_name']}\nRelevant columns:\n" + "\n".join(table["columns"]))
+    context_str = "\n---\n".join(parts)
     return f"Here are the most relevant schema details found:\n{context_str}"
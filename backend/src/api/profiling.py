@@ -0,0 +1,37 @@
+import re
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from src.core.profiling import should_profile, start_profile
+from src.core.utils import generate_uuid
+
+_THREAD_ID_PATTERN = re.compile(r"/v1/conversation/([0-9a-fA-F-]{36})")
+
+
+async def profile_requests(request: Request, call_next):
+    """
+    Profiles the request if it carries the admin `X-Profile-Token` header or is sampled.
+    The profile id is returned in the `X-Profile-Id` header.
+    """
+    if not should_profile(request.headers.get("x-profile-token")):
+        return await call_next(request)
+
+    match = _THREAD_ID_PATTERN.match(request.url.path)
+    request_id = generate_uuid()
+    profile = start_profile(match.group(1) if match else "no-thread", request_id,
+                            f"{request.method} {request.url.path}")
+    response = await call_next(request)
+    response.headers["X-Profile-Id"] = request_id
+
+    # streaming bodies are produced after this returns, the profile is saved once the body is sent.
+    body_iterator = response.body_iterator
+
+    async def profiled_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            await run_in_threadpool(profile.save)
+
+    response.body_iterator = profiled_body()
+    return response
@@ -1,22 +1,45 @@
-import json
+import asyncio
+import contextvars
+import logging
+import re
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Header
 from fastapi import HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.runnables import RunnableConfig
 from openai import BaseModel
-from sqlalchemy import create_engine, text
-from src.agent.graph import graph
+from pydantic import Field
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from src.agent.graph import graph, stateless_graph
+from src.agent.nodes.router_nodes import router_snapshot
 from src.agent.langfuse_connection import langfuse_handler
 from src.agent.state import State
 from src.api.deps import validate_thread_id
+from src.api.streaming import dumps_event, ndjson_response, stream_stats
+from src.core.admission import AdmissionRejected, db_limiter, limiters_snapshot
 from src.core.config import config
+from src.core.db import get_engine
+from src.core.embeddings import embedding_cache_stats
+from src.core.llm_router import latency_tracker
+from src.core.llms import llm_response_cache
 from src.core.models import DatabaseCredentials, Message
+from src.core.preview import preview_sql
+from src.core.profiling import profiling_callbacks, list_profiles, profile_path
+from src.core.sql_analysis import sql_analysis_stats
 from src.core.utils import generate_uuid
 from src.core.utils import normalize_sql_rows
-from src.indexer.index import index_database, construct_db_uri
+from src.core.vector_store import touch_thread
+from src.core.web_search import web_search_client
+from src.indexer.index import index_database, construct_db_uri, construct_test_db_uri
+from src.indexer.jobs import start_indexing_job, get_indexing_job
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1")
 
@@ -27,32 +50,57 @@ def test_connection():
     return {"status": "ok", "message": "Backend is reachable"}
 
 
+@router.get("/metrics")
+def metrics():
+    """Internal counters of caches and limiters."""
+    return {
+        "llm_cache": None if llm_response_cache is None else {
+            **llm_response_cache.stats,
+            "hit_ratio": llm_response_cache.hit_ratio,
+        },
+        "embedding_cache": embedding_cache_stats(),
+        "llm_latency": latency_tracker.snapshot(),
+        "limiters": limiters_snapshot(),
+        "sql_analysis": sql_analysis_stats,
+        "streams": stream_stats,
+        "web_search": web_search_client.stats,
+        "router": router_snapshot(),
+    }
+
+
+def _require_profiling_admin(x_profile_token: Optional[str] = Header(default=None)):
+    if not config.profiling_admin_token or x_profile_token != config.profiling_admin_token:
+        raise HTTPException(status_code=403, detail={"error": "Forbidden"})
+
+
+@router.get("/conversation/{thread_id}/profiles", dependencies=[Depends(_require_profiling_admin)])
+def get_profiles(thread_id: str = Depends(validate_thread_id)):
+    return {"thread_id": thread_id, "profiles": list_profiles(thread_id)}
+
+
+@router.get("/conversation/{thread_id}/profiles/{request_id}", dependencies=[Depends(_require_profiling_admin)])
+def download_profile(request_id: str, thread_id: str = Depends(validate_thread_id)):
+    path = profile_path(thread_id, request_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail={"error": "Unknown profile."})
+    return FileResponse(path, media_type="application/json", filename=f"{request_id}.json")
+
+
 # @router.get("/conversations")
 
 
-@router.post("/conversation/init")
-def init_conversation(credentials: DatabaseCredentials, use_test_db: bool = Query(default=False)):
-    if use_test_db:
-        credentials = DatabaseCredentials(
-            engine=config.test_db_engine,
-            host=config.test_db_host,
-            port=config.test_db_port,
-            username=config.test_db_username,
-            password=config.test_db_password,
-            database=config.test_db_name,
-        )
-    thread_id = generate_uuid()
-    database_uri = construct_db_uri(credentials)
-    database_summary, database_structure = index_database(database_uri, thread_id)
+def _log_rejection(e: AdmissionRejected, thread_id: str):
+    logger.warning("Rejected a request of thread %s: limiter %s, %s, queue depth %d",
+                   thread_id, e.limiter_name, e.reason, e.queue_depth)
 
-    if database_structure.startswith("Error:"):
-        raise HTTPException(status_code=400, detail={"error": database_structure})
 
-    # The frontend can use this structured data to generate a starter message.
+def _save_conversation_state(thread_id: str, database_uri: str, engine: str, schema_context: str,
+                             schema_catalog: dict):
     state_to_save = State(
         database_uri=database_uri,
-        database_dialect=credentials.engine,
-        schema_context=database_structure,
+        database_dialect=engine,
+        schema_context=schema_context,
+        schema_catalog=schema_catalog,
     )
 
     graph.invoke(state_to_save, config=RunnableConfig(
@@ -64,18 +112,118 @@ def init_conversation(credentials: DatabaseCredentials, use_test_db: bool = Quer
         },
     ))
 
+
+def _has_schema(thread_id: str) -> bool:
+    """The schema context is saved once the schema is indexed, by the synchronous init or the job."""
+    snapshot = graph.get_state(RunnableConfig(configurable={"thread_id": thread_id}))
+    return bool(snapshot.values.get("schema_context"))
+
+
+def _ensure_schema_ready(thread_id: str):
+    job = get_indexing_job(thread_id)
+    if job is not None and not job.schema_ready:
+        detail = job.error if job.status == "failed" else "Database schema is still being indexed."
+        raise HTTPException(status_code=409, detail={"error": detail, "status": job.status})
+    if job is None and not _has_schema(thread_id):
+        raise HTTPException(status_code=404, detail={"error": "Unknown conversation."})
+    touch_thread(thread_id)
+
+
+@router.post("/conversation/init")
+def init_conversation(credentials: DatabaseCredentials, use_test_db: bool = Query(default=False),
+                      background: bool = Query(default=False),
+                      schema_format: Optional[Literal["verbose", "compact"]] = Query(default=None)):
+    if use_test_db:
+        database_uri, engine = construct_test_db_uri(), config.test_db_engine
+    else:
+        database_uri, engine = construct_db_uri(credentials), credentials.engine
+    thread_id = generate_uuid()
+
+    if background:
+        # indexing continues in the background, progress is at /conversation/{thread_id}/status.
+        start_indexing_job(thread_id, database_uri, on_schema_ready=lambda schema_context, schema_catalog:
+                           _save_conversation_state(thread_id, database_uri, engine,
+                                                    schema_context, schema_catalog),
+                           schema_format=schema_format)
+        return JSONResponse({"thread_id": thread_id, "status": "pending"}, status_code=202)
+
+    database_summary, database_structure, schema_catalog = index_database(database_uri, thread_id,
+                                                                          schema_format=schema_format)
+
+    if database_structure.startswith("Error:"):
+        raise HTTPException(status_code=400, detail={"error": database_structure})
+
+    # The frontend can use this structured data to generate a starter message.
+    _save_conversation_state(thread_id, database_uri, engine, database_structure, schema_catalog)
+
     return {
         "thread_id": thread_id,
         "schema": database_summary
     }
 
 
+@router.get("/conversation/{thread_id}/status")
+async def conversation_status(thread_id: str = Depends(validate_thread_id), stream: bool = Query(default=False)):
+    """
+    Progress of the background init. With `stream`, sends NDJSON status updates until the job finishes.
+    """
+    job = get_indexing_job(thread_id)
+    if job is None:
+        # synchronous init or an expired job - the conversation exists if its schema was saved.
+        if not _has_schema(thread_id):
+            raise HTTPException(status_code=404, detail={"error": "Unknown conversation."})
+        return {"thread_id": thread_id, "status": "done"}
+    if not stream:
+        return job.to_dict()
+
+    async def stream_status():
+        nonlocal job
+        version = -1
+        while True:
+            job = await asyncio.to_thread(get_indexing_job, thread_id) or job  # may run on another worker
+            if job.version != version:
+                version = job.version
+                yield dumps_event(job.to_dict())
+            if job.status in ("done", "failed"):
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(stream_status(), media_type="application/x-ndjson")
+
+
 class ExecuteSQLRequest(BaseModel):
     query: str
+    preview: bool = False  # approximate results over samples of the tables
+    exact_follow_up: bool = False  # with preview: stream the preview, then the exact results as NDJSON
+
+
+def _exact_result_events(database_uri: str, sql: str, thread_id: str):
+    """Runs `sql` exactly after a preview and yields its rows as `exact_results_chunk` events."""
+    started = time.monotonic()
+    row_count = 0
+    try:
+        with db_limiter(database_uri).acquire(thread_id), get_engine(database_uri).connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(sql))
+            for partition in result.mappings().partitions(config.query_results_chunk_rows):
+                chunk = normalize_sql_rows(partition)
+                row_count += len(chunk)
+                yield {"event": "exact_results_chunk", "data": chunk}
+    except AdmissionRejected as e:
+        _log_rejection(e, thread_id)
+        yield {"event": "exact_results_error", "status": 503,
+               "data": "Service is busy, please retry in a few seconds."}
+        return
+    except Exception:
+        logger.exception("Exact query after a preview failed, thread %s", thread_id)
+        yield {"event": "exact_results_error", "data": "Sorry, the exact query failed."}
+        return
+    yield {"event": "exact_results_done",
+           "data": {"row_count": row_count, "total_ms": round((time.monotonic() - started) * 1000)}}
 
 
 @router.post("/conversation/{thread_id}/sql")
-async def execute_sql(req: ExecuteSQLRequest, thread_id: str = Depends(validate_thread_id)):
+async def execute_sql(request: Request, req: ExecuteSQLRequest, thread_id: str = Depends(validate_thread_id)):
+    _ensure_schema_ready(thread_id)
     query = req.query
     state = graph.invoke({}, config=RunnableConfig(
         configurable={
@@ -85,39 +233,65 @@ async def execute_sql(req: ExecuteSQLRequest, thread_id: str = Depends(validate_
             "init": True,
         },
     ))
-    engine = create_engine(state['database_uri'])
-    with engine.connect() as conn:
-        result = conn.execute(text(query))
+    engine = get_engine(state['database_uri'])
+    preview = None
+    if req.preview:
+        preview = preview_sql(query, state['database_dialect'], config.preview_sample_percent,
+                              config.preview_max_scan_rows)
+    with db_limiter(state['database_uri']).acquire(thread_id), engine.connect() as conn:
+        try:
+            result = conn.execute(text(preview.sql if preview else query))
+        except DBAPIError:
+            if preview is None or preview.method != "tablesample":
+                raise
+            conn.rollback()  # the table can't be sampled natively, scan a part of it instead.
+            preview = preview_sql(query, state['database_dialect'], config.preview_sample_percent,
+                                  config.preview_max_scan_rows, bounded=True)
+            result = conn.execute(text(preview.sql))
         rows = result.mappings().all()
         rows = normalize_sql_rows(rows)
 
-    return {
-        "query_results": rows,
-    }
+    if preview is None:
+        return {
+            "query_results": rows,
+        }
+    if not req.exact_follow_up:
+        return {"query_results": rows, "approximate": preview.info}
+
+    def preview_then_exact():
+        yield {"event": "query_results", "data": rows, "approximate": preview.info}
+        yield from _exact_result_events(state['database_uri'], query, thread_id)
+
+    return ndjson_response(request, preview_then_exact())
 
 
 @router.post("/conversation/{thread_id}")
 async def chat(
+        request: Request,
         msg: Message,
         thread_id: str = Depends(validate_thread_id),
         stream: bool = Query(default=False),
+        use_cache: bool = Query(default=True),
+        preview: bool = Query(default=False),
+        exact_follow_up: bool = Query(default=False),
 ):
+    _ensure_schema_ready(thread_id)
     content = msg.content
     cfg = RunnableConfig(
         configurable={
             "thread_id": thread_id,
             "recursion_limit": 1,
             "model": "default",
+            "use_llm_cache": use_cache,
+            "preview": preview,
         },
-        callbacks=[langfuse_handler],
+        callbacks=[langfuse_handler, *profiling_callbacks()],
         metadata={"langfuse_session_id": thread_id},
     )
     if stream:
-        def preprocess_event(event):
-            return (json.dumps(event, ensure_ascii=False) + "\n").encode()
-
-        def stream_response():
-            yield preprocess_event({"event": "start", "chat_id": thread_id})
+        def stream_events():
+            yield {"event": "start", "chat_id": thread_id}
+            values = {}
             try:
                 for stream_type, chunk in graph.stream(
                         {
@@ -128,12 +302,18 @@ async def chat(
                 ):
                     if stream_type == "custom":
                         event_type = list(chunk.keys())[0]
-                        yield preprocess_event({"event": event_type, "data": chunk.get(event_type, "")})
+                        event = {"event": event_type, "data": chunk.get(event_type, "")}
+                        if "tool_call_id" in chunk:
+                            event["tool_call_id"] = chunk["tool_call_id"]
+                        yield event
                         continue
                     if stream_type == "values":
+                        values = chunk
                         continue
                     if chunk[0].additional_kwargs or not isinstance(chunk[0], AIMessage):
                         continue
+                    if chunk[1].get("langgraph_node") == "fast_path":  # its answer comes as a custom event
+                        continue
                     token = chunk[0].content
                     if not token: continue
                     if isinstance(token, list):  # anthropic tokens preprocessing
@@ -142,13 +322,20 @@ async def chat(
                         if token[0]['type'] != "text":
                             continue
                         token = token[0]['text']
-                    yield preprocess_event({"event": "content", "data": token})
-                yield preprocess_event({"event": "end", "chat_id": thread_id})
+                    yield {"event": "content", "data": token}
+                if exact_follow_up and values.get("query_approximation") and values.get("sql_query"):
+                    # the answer is based on the preview, the exact rows follow once the full query finishes.
+                    yield from _exact_result_events(values["database_uri"], values["sql_query"], thread_id)
+                yield {"event": "end", "chat_id": thread_id}
+            except AdmissionRejected as e:
+                _log_rejection(e, thread_id)
+                yield {"event": "error", "chat_id": thread_id, "status": 503,
+                       "data": "Service is busy, please retry in a few seconds."}
             except Exception as e:
                 print(e)
-                yield preprocess_event({"event": "error", "chat_id": thread_id, "data": "Sorry, an error occurred."})
+                yield {"event": "error", "chat_id": thread_id, "data": "Sorry, an error occurred."}
 
-        return StreamingResponse(stream_response(), media_type="application/x-ndjson")
+        return ndjson_response(request, stream_events())
     extra = {}
     try:
         response = graph.invoke(
@@ -157,10 +344,14 @@ async def chat(
         )
 
         extra = {"sql_query": response.get('sql_query'),
-                 "rows": response.get('query_results')}
+                 "rows": response.get('query_results'),
+                 "approximate": response.get('query_approximation')}
         response_content = response['messages'][-1].content
         status_code = 200
 
+    except AdmissionRejected as e:
+        _log_rejection(e, thread_id)
+        raise
     except Exception as e:
         last = traceback.extract_tb(e.__traceback__)[-1]
         print(last, e)
@@ -175,3 +366,82 @@ async def chat(
             **extra,
         }]
     }, status_code=status_code)
+
+
+class BatchRequest(BaseModel):
+    questions: List[str] = Field(min_length=1, max_length=config.batch_max_questions)
+    max_parallel: Optional[int] = Field(default=None, ge=1)  # capped at config.batch_max_parallel
+
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().casefold()
+
+
+@router.post("/conversation/{thread_id}/batch")
+def batch_questions(request: Request, req: BatchRequest, thread_id: str = Depends(validate_thread_id)):
+    """
+    Answers many independent questions (e.g. dashboard tiles) against the thread's database.
+    Identical questions are answered once. Questions run concurrently from the thread's schema context,
+    without its conversation history, and nothing is added to the conversation.
+    Results are streamed as NDJSON in completion order, `indices` point into `questions`.
+    """
+    _ensure_schema_ready(thread_id)
+    base = graph.get_state(RunnableConfig(configurable={"thread_id": thread_id})).values
+    if not base:
+        raise HTTPException(status_code=404, detail={"error": "Unknown conversation."})
+
+    unique: Dict[str, List[int]] = {}
+    for i, question in enumerate(req.questions):
+        unique.setdefault(_normalize_question(question), []).append(i)
+    max_parallel = min(req.max_parallel or config.batch_max_parallel, config.batch_max_parallel)
+    callbacks = [langfuse_handler, *profiling_callbacks()]
+
+    def answer(question: str) -> dict:
+        started = time.monotonic()
+        response = stateless_graph.invoke(
+            State(
+                database_uri=base["database_uri"],
+                database_dialect=base["database_dialect"],
+                schema_context=base["schema_context"],
+                schema_catalog=base.get("schema_catalog") or {},
+                messages=[HumanMessage(content=question)],
+            ),
+            config=RunnableConfig(
+                configurable={
+                    "thread_id": thread_id,  # shares the thread's schema index and fair-queuing slot
+                    "model": "default",
+                    "keep_results": False,
+                },
+                callbacks=callbacks,
+                metadata={"langfuse_session_id": thread_id},
+            ),
+        )
+        return {
+            "content": response["messages"][-1].content,
+            "sql_query": response.get("sql_query"),
+            "rows": response.get("query_results"),
+            "elapsed_ms": round((time.monotonic() - started) * 1000),
+        }
+
+    def stream_results():
+        yield {"event": "start", "chat_id": thread_id, "questions": len(req.questions), "unique": len(unique)}
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            futures = {
+                # each question gets a copy of the request context (profiling etc.)
+                executor.submit(contextvars.copy_context().run, answer, req.questions[indices[0]]): indices
+                for indices in unique.values()
+            }
+            for future in as_completed(futures):
+                indices = futures[future]
+                try:
+                    yield {"event": "result", "indices": indices, **future.result()}
+                except AdmissionRejected as e:
+                    _log_rejection(e, thread_id)
+                    yield {"event": "error", "indices": indices, "status": 503,
+                           "data": "Service is busy, please retry in a few seconds."}
+                except Exception:
+                    logger.exception("Batch question failed, thread %s", thread_id)
+                    yield {"event": "error", "indices": indices, "data": "Sorry, an error occurred."}
+        yield {"event": "end", "chat_id": thread_id}
+
+    return ndjson_response(request, stream_results())
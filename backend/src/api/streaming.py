@@ -0,0 +1,186 @@
+"""
+NDJSON streaming helpers: orjson serialization, coalescing of token events into bigger frames
+and negotiated gzip/zstd compression of the stream.
+"""
+import contextvars
+import queue
+import threading
+import time
+import zlib
+from typing import Iterator, Optional
+
+import orjson
+import zstandard
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from src.core.config import config
+
+stream_stats = {
+    "streams": 0,
+    "events": 0,
+    "frames": 0,
+    "raw_bytes": 0,
+    "wire_bytes": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def dumps_event(event: dict) -> bytes:
+    return orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS, default=str) + b"\n"
+
+
+class _PumpError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_END = object()
+
+
+def _pump(events: Iterator[dict], items: queue.Queue, stop: threading.Event):
+    """Moves `events` into `items`, so the consumer can wait for the next one with a timeout."""
+    try:
+        for event in events:
+            if stop.is_set():
+                break
+            items.put(event)
+    except BaseException as e:
+        items.put(_PumpError(e))
+    finally:
+        if hasattr(events, "close"):
+            events.close()
+        items.put(_END)
+
+
+def coalesce_events(events: Iterator[dict], flush_ms: int, flush_bytes: int) -> Iterator[bytes]:
+    """
+    Merges consecutive `content` events into one and yields NDJSON frames.
+    The first `content` event after any other event is sent right away, the text that follows is held back
+    at most `flush_ms` (or until `flush_bytes` accumulated). Any other event flushes it immediately,
+    so control events are never delayed. `events` is read by a separate thread, so buffered text
+    is flushed on time even while the next token takes long.
+    """
+    items = queue.Queue()
+    stop = threading.Event()
+    threading.Thread(target=contextvars.copy_context().run, args=(_pump, events, items, stop),
+                     name="stream-pump", daemon=True).start()
+    pending_text = []
+    pending_size = 0
+    deadline = None  # when the pending text has to be sent
+    after_content = False
+
+    def flush_text() -> bytes:
+        nonlocal pending_text, pending_size, deadline
+        deadline = None
+        if not pending_text:
+            return b""
+        frame = dumps_event({"event": "content", "data": "".join(pending_text)})
+        pending_text, pending_size = [], 0
+        return frame
+
+    try:
+        while True:
+            try:
+                item = items.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                yield flush_text()
+                continue
+            if item is _END:
+                break
+            if isinstance(item, _PumpError):
+                raise item.error
+            if item.get("event") != "content":
+                after_content = False
+                yield flush_text() + dumps_event(item)
+                continue
+            if not after_content:
+                after_content = True
+                yield dumps_event(item)
+                continue
+            pending_text.append(item["data"])
+            pending_size += len(item["data"])
+            if deadline is None:
+                deadline = time.monotonic() + flush_ms / 1000
+            if pending_size >= flush_bytes:
+                yield flush_text()
+        if pending_text:
+            yield flush_text()
+    finally:
+        stop.set()
+
+
+class _Compressor:
+    def __init__(self, encoding: Optional[str]):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._zstd = zstandard.ZstdCompressor(level=3).compressobj()
+        elif encoding == "gzip":
+            self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def frame(self, data: bytes) -> bytes:
+        """Compresses `data` and flushes, so the client can decode it right away."""
+        if self.encoding == "zstd":
+            return self._zstd.compress(data) + self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "gzip":
+            return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+    def end(self) -> bytes:
+        if self.encoding == "zstd":
+            return self._zstd.flush()
+        if self.encoding == "gzip":
+            return self._gzip.flush()
+        return b""
+
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    if not config.stream_compression:
+        return None
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("accept-encoding", "").split(",")
+    }
+    for encoding in ("zstd", "gzip"):
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def ndjson_response(request: Request, events: Iterator[dict]) -> StreamingResponse:
+    """Streams `events` as coalesced, optionally compressed NDJSON."""
+    compressor = _Compressor(negotiate_encoding(request))
+
+    def counted(source):
+        count = 0
+        for event in source:
+            count += 1
+            yield event
+        with _stats_lock:
+            stream_stats["events"] += count
+
+    def body():
+        frames = raw_bytes = wire_bytes = 0
+        try:
+            for frame in coalesce_events(counted(events), config.stream_flush_ms, config.stream_flush_bytes):
+                if not frame:
+                    continue
+                data = compressor.frame(frame)
+                frames += 1
+                raw_bytes += len(frame)
+                wire_bytes += len(data)
+                yield data
+            tail = compressor.end()
+            wire_bytes += len(tail)
+            if tail:
+                yield tail
+        finally:
+            with _stats_lock:
+                stream_stats["streams"] += 1
+                stream_stats["frames"] += frames
+                stream_stats["raw_bytes"] += raw_bytes
+                stream_stats["wire_bytes"] += wire_bytes
+
+    headers = {"Vary": "Accept-Encoding"}
+    if compressor.encoding:
+        headers["Content-Encoding"] = compressor.encoding
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
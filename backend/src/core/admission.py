@@ -0,0 +1,155 @@
+"""
+Admission control for the shared backends: LLM providers (per model key) and
+customer databases (per database URI).
+
+Every backend gets a `FairLimiter` with bounded concurrency. Waiting requests are queued
+per thread_id and slots are handed out round-robin across threads, so one heavy
+conversation can't monopolize a provider. Waiting longer than the queue timeout (or
+arriving at a full queue) raises `AdmissionRejected`, which the API turns into a 503.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict
+
+from langgraph.config import get_config
+from sqlalchemy.engine import make_url
+from src.core.config import config
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request couldn't get a slot in time."""
+
+    def __init__(self, limiter_name: str, reason: str, queue_depth: int = 0):
+        super().__init__(f"{limiter_name}: {reason}")
+        self.limiter_name = limiter_name
+        self.reason = reason
+        self.queue_depth = queue_depth  # waiting requests when this one was rejected
+
+
+class _Waiter:
+    __slots__ = ("granted", "event")
+
+    def __init__(self):
+        self.granted = False
+        self.event = threading.Event()
+
+
+class FairLimiter:
+    def __init__(self, name: str, max_concurrency: int, queue_timeout: float, max_queue_depth: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_queue_depth = max_queue_depth
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.stats = {"admitted": 0, "rejected": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()  # thread_id -> waiters, in round-robin order
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, thread_id: str = "anonymous", wait: bool = True):
+        """Holds a slot, `wait=False` raises `AdmissionRejected` right away instead of queueing."""
+        started = time.monotonic()
+        self._wait_for_slot(thread_id, wait)
+        waited = time.monotonic() - started
+        with self._lock:
+            self.stats["admitted"] += 1
+            self.stats["wait_seconds_total"] += waited
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _wait_for_slot(self, thread_id: str, wait: bool = True):
+        with self._lock:
+            if self.in_flight < self.max_concurrency and not self._queues:
+                self.in_flight += 1
+                return
+            if not wait:
+                raise AdmissionRejected(self.name, "no free slot", self.queue_depth)
+            if self.queue_depth >= self.max_queue_depth:
+                self.stats["rejected"] += 1
+                raise AdmissionRejected(self.name, "queue is full", self.queue_depth)
+            waiter = _Waiter()
+            self._queues.setdefault(thread_id, deque()).append(waiter)
+            self.queue_depth += 1
+
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            if waiter.granted:
+                return
+            queue = self._queues[thread_id]
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[thread_id]
+            self.queue_depth -= 1
+            self.stats["rejected"] += 1
+            queue_depth = self.queue_depth
+        raise AdmissionRejected(self.name, f"no free slot within {self.queue_timeout}s", queue_depth)
+
+    def _release(self):
+        with self._lock:
+            if not self._queues:
+                self.in_flight -= 1
+                return
+            # hand the slot over to the next thread in round-robin order, in_flight stays the same.
+            thread_id, queue = self._queues.popitem(last=False)
+            waiter = queue.popleft()
+            if queue:
+                self._queues[thread_id] = queue  # back to the end of the line
+            self.queue_depth -= 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            admitted = self.stats["admitted"]
+            return {
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                "max_concurrency": self.max_concurrency,
+                **self.stats,
+                "wait_seconds_avg": self.stats["wait_seconds_total"] / admitted if admitted else 0.0,
+            }
+
+
+_limiters: Dict[str, FairLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _get_limiter(name: str, max_concurrency: int) -> FairLimiter:
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = FairLimiter(
+                name,
+                max_concurrency=max_concurrency,
+                queue_timeout=config.admission_queue_timeout_seconds,
+                max_queue_depth=config.admission_max_queue_depth,
+            )
+        return _limiters[name]
+
+
+def llm_limiter(model_key: str) -> FairLimiter:
+    return _get_limiter(f"llm:{model_key}", config.llm_max_concurrency)
+
+
+def db_limiter(database_uri: str) -> FairLimiter:
+    # don't leak credentials into metrics.
+    return _get_limiter(f"db:{make_url(database_uri).render_as_string(hide_password=True)}", config.db_max_concurrency)
+
+
+def current_thread_id() -> str:
+    """thread_id of the graph run we're in, if any."""
+    try:
+        return get_config()["configurable"].get("thread_id") or "anonymous"
+    except (RuntimeError, KeyError):
+        return "anonymous"
+
+
+def limiters_snapshot() -> dict:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.snapshot() for limiter in limiters}
@@ -1,8 +1,9 @@
 from pathlib import Path
-from typing import Literal
+from typing import List, Literal
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
+from src.core.constants import DEFAULT_OMIT_PATTERNS
 
 load_dotenv()
 
@@ -21,6 +22,13 @@ class Config(BaseSettings):
 
     jina_api_key: str
 
+    # web search
+    web_search_url: str = "https://s.jina.ai"
+    web_search_timeout_seconds: float = 3
+    web_search_max_connections: int = 20
+    web_search_cache_ttl_seconds: int = 60 * 60
+    web_search_cache_max_entries: int = 1_000
+
     # test db
     test_db_engine: str
     test_db_host: str
@@ -38,8 +46,113 @@ class Config(BaseSettings):
 
     # internal
     sql_generation_max_iterations: int = 3
+    query_results_chunk_rows: int = 500  # rows per `query_results_chunk` stream event
     default_llm_model: str = "qwen-3-235b-a22b-instruct-2507-no-streaming"
+    dba_llm_model: str = "qwen-3-235b-a22b-instruct-2507"  # has to stream, the SQL is sent while it's generated
     context_token_limit: int = 64_128
 
+    # serving
+    workers: int = 1
+    # shared location of checkpoints, caches and the vector store, relative paths below are resolved against it.
+    data_dir: str = str(Path(__file__).parents[2])
+    checkpoint_backend: Literal["sqlite", "postgres"] = "sqlite"
+    checkpoint_path: str = "checkpoints.sqlite"
+    checkpoint_postgres_uri: str = ""
+    chroma_path: str = "chroma_db"
+    chroma_server_host: str = ""  # use a chroma server instead of the embedded client, recommended with workers > 1.
+    chroma_server_port: int = 8000
+
+    # embeddings: "openai" (text-embedding-3-large), "qwen" (local SentenceTransformer) or "local" (hashed
+    # n-grams with TF-IDF weighting, offline and without a model)
+    embedding_model: Literal["openai", "qwen", "local"] = "openai"
+    local_embedding_dimensions: int = 1024
+    embedding_cache_path: str = "embedding_cache.sqlite"
+    embedding_cache_max_entries: int = 50_000
+    embedding_batch_size: int = 64
+
+    # llm response cache
+    llm_cache_enabled: bool = False
+    llm_cache_path: str = "llm_cache.sqlite"
+    llm_cache_ttl_seconds: int = 24 * 60 * 60
+    llm_cache_memory_max_entries: int = 1_000
+    llm_cache_disk_max_entries: int = 20_000
+
+    # llm hedging
+    llm_hedging_enabled: bool = False
+    llm_hedge_default_delay_seconds: float = 5.0  # used until enough latency samples are collected.
+
+    # admission control
+    llm_max_concurrency: int = 16  # per model key
+    db_max_concurrency: int = 4  # per database uri
+    db_engine_cache_size: int = 64
+    admission_queue_timeout_seconds: float = 30
+    admission_max_queue_depth: int = 200
+
+    # ndjson streams
+    stream_flush_ms: int = 40  # content tokens are merged into one frame for up to this long
+    stream_flush_bytes: int = 2048  # or until this much text accumulated
+    stream_compression: bool = True  # gzip/zstd if the client accepts it
+
+    # per-request profiling, by admin header `X-Profile-Token` or sampling
+    profiling_admin_token: str = ""
+    profiling_sample_rate: float = 0.0
+
+    # approximate previews, tables are sampled natively or scanned up to a row limit
+    preview_sample_percent: float = 1.0
+    preview_max_scan_rows: int = 1_000_000
+
+    # fast path: questions scored at least `fast_path_threshold` by the router skip the business analyst
+    fast_path_enabled: bool = True
+    fast_path_threshold: float = 1.0
+    fast_path_max_words: int = 14  # longer questions are penalized
+    fast_path_answer_max_rows: int = 10
+
+    # tool calls of one business analyst turn run in parallel
+    tool_calls_max_parallel: int = 4
+
+    # batch questions
+    batch_max_questions: int = 50
+    batch_max_parallel: int = 8
+
+    # background conversation init
+    indexing_jobs_concurrency: int = 2
+    indexing_jobs_path: str = "indexing_jobs.sqlite"  # status of the jobs, shared by the workers
+
+    # schema context in prompts: "verbose" or "compact" (DDL-like, can be chosen per thread at init)
+    schema_format: Literal["verbose", "compact"] = "verbose"
+    # columns left out of the compact format (full match, case-insensitive), keys are always kept
+    schema_compact_omit_columns: List[str] = list(DEFAULT_OMIT_PATTERNS)
+
+    # schema summary, bigger schemas are summarized in chunks of related tables
+    schema_summary_chunk_chars: int = 24_000
+    schema_summary_concurrency: int = 4
+
+    # schema value profiling
+    schema_profiling_enabled: bool = False
+    schema_profile_sample_rows: int = 10_000
+    schema_profile_max_distinct: int = 20
+    schema_profile_max_tables: int = 200
+
+    # local workspace of previous results
+    result_workspace_max_results: int = 5  # per thread
+    result_workspace_max_rows: int = 200_000  # bigger results aren't kept
+    result_workspace_max_threads: int = 200
+    result_workspace_dir: str = ""  # empty - in memory, otherwise a directory (relative to data_dir)
+
+    # schema retrieval, lexical and vector search over table and column documents
+    schema_column_documents: bool = True
+    schema_search_candidates: int = 50  # per ranking
+    schema_search_budget_ms: int = 300  # the vector search is skipped when it would take longer
+    schema_search_max_tables: int = 3
+    schema_search_max_columns: int = 15  # per table, key columns are added on top
+
+    # vector store
+    vector_thread_ttl_hours: int = 24 * 7
+    vector_gc_interval_seconds: int = 60 * 60
+
+    def resolve_path(self, path: str) -> str:
+        """Paths in the config are relative to `data_dir`, so all workers share the same files."""
+        return str(Path(self.data_dir) / path)
+
 
 config = Config(_env_file=Path(__file__).parents[3] / ".env", )  # noqa
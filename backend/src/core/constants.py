@@ -0,0 +1,7 @@
+"""Defaults shared by the config and the modules that use them, without importing either."""
+
+# audit and ETL bookkeeping columns left out of the compact schema format, rarely asked about
+DEFAULT_OMIT_PATTERNS = (
+    r"(updated|modified)_(at|by|on|date)", r"created_by", r"last_(updated|modified)(_at|_by)?",
+    r"row_?version", r"etl_\w*", r"_\w*",
+)
@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from filelock import FileLock
+from sqlalchemy import create_engine, Engine
+from src.core.config import config
+
+_engines: "OrderedDict[str, Engine]" = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def get_engine(database_uri: str) -> Engine:
+    """
+    Returns a process-wide engine (and so a connection pool) per database uri.
+    Least recently used engines above `config.db_engine_cache_size` are disposed.
+    """
+    with _engines_lock:
+        if database_uri not in _engines:
+            _engines[database_uri] = create_engine(database_uri, pool_pre_ping=True)
+        _engines.move_to_end(database_uri)
+        while len(_engines) > config.db_engine_cache_size:
+            _, engine = _engines.popitem(last=False)
+            engine.dispose()
+        return _engines[database_uri]
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite connection that can be shared by threads of this process and used
+    concurrently with other worker processes: WAL journal, so readers don't block the writer,
+    and a busy timeout instead of failing immediately on a locked database.
+    Every process must open its own connection.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextmanager
+def process_lock(name: str, timeout: float = 600):
+    """
+    Lock shared by all worker processes on this host, e.g. so only one of them indexes a schema
+    while the others wait and reuse the result. Raises `filelock.Timeout` after `timeout` seconds,
+    `timeout=0` makes it non-blocking.
+    """
+    lock_dir = Path(config.resolve_path("locks"))
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with FileLock(str(lock_dir / f"{name}.lock"), timeout=timeout):
+        yield
@@ -1,10 +1,135 @@
+import hashlib
+import logging
 import os
+import threading
+import time
+
+import numpy as np
 from src.core.config import config
+from src.core.db import connect_sqlite
+
+logger = logging.getLogger(__name__)
 
 # A cache for the embedding function to avoid re-initializing it every time.
 _embedding_function_cache = None
 
 
+class CachedEmbeddingFunction:
+    """
+    Wraps a Chroma embedding function with a persistent cache keyed by
+    (model name, sha256 of the document text).
+
+    Only cache misses are sent to the underlying model, in batches of `batch_size`.
+    The cache is bounded by `max_entries`; least recently used vectors are evicted first.
+    Everything else (name, config, spaces) is delegated to the wrapped function,
+    so Chroma sees the same embedding function it would without the cache.
+    """
+
+    def __init__(self, embedding_function, model_name: str, path: str, max_entries: int, batch_size: int):
+        self._embedding_function = embedding_function
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def __getattr__(self, item):
+        if item == "_embedding_function":  # not initialized yet, avoid recursion.
+            raise AttributeError(item)
+        return getattr(self._embedding_function, item)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def stats(self) -> dict:
+        return {"model": self.model_name, "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hit_ratio, 3)}
+
+    def __call__(self, input):
+        hashes = [hashlib.sha256(doc.encode("utf-8")).hexdigest() for doc in input]
+        cached = self._lookup(set(hashes))
+
+        missing = {}  # hash -> document, deduplicated so repeated texts are embedded once.
+        for doc_hash, doc in zip(hashes, input):
+            if doc_hash not in cached:
+                missing.setdefault(doc_hash, doc)
+
+        computed = {}
+        missing_items = list(missing.items())
+        for start in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[start:start + self.batch_size]
+            vectors = self._embedding_function([doc for _, doc in batch])
+            for (doc_hash, _), vector in zip(batch, vectors):
+                computed[doc_hash] = np.asarray(vector, dtype=np.float32)
+        if computed:
+            self._store(computed)
+
+        hits = len(input) - sum(1 for h in hashes if h in missing)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(input) - hits
+        logger.info("Embedding cache (%s): %d/%d hits (%.0f%%), %d embedded in %d batches.",
+                    self.model_name, hits, len(input), 100 * hits / max(len(input), 1),
+                    len(computed), (len(computed) + self.batch_size - 1) // self.batch_size)
+
+        return [cached[h] if h in cached else computed[h] for h in hashes]
+
+    def embed_query(self, input):
+        # queries are one-off, no point in caching them.
+        embed_query = getattr(self._embedding_function, "embed_query", None)
+        return embed_query(input) if embed_query else self._embedding_function(input)
+
+    def _lookup(self, hashes: set) -> dict:
+        found = {}
+        hashes = list(hashes)
+        with self._lock:
+            for start in range(0, len(hashes), 500):  # stay below sqlite's variable limit
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+                for doc_hash, blob in rows:
+                    found[doc_hash] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, self.model_name, h) for h in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, vectors: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model_name, h, v.tobytes(), now) for h, v in vectors.items()],
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+
 def _get_openai_embedding_function():
     """
     Returns an instance of the OpenAI Embedding Function.
@@ -43,13 +168,28 @@ def _get_qwen_embedding_function():
     )
 
 
+def _get_local_embedding_function():
+    """
+    Returns the local hashed n-gram embedding function, no model to download and no API calls.
+    """
+    from src.core.local_embeddings import LocalEmbeddingFunction
+
+    return LocalEmbeddingFunction(dimensions=config.local_embedding_dimensions)
+
+
+def embedding_cache_stats():
+    """Hits and misses of the embedding cache since start, None before anything was embedded or searched."""
+    return None if _embedding_function_cache is None else _embedding_function_cache.stats
+
+
 def get_embedding_function():
     """
     Factory function to get the configured embedding function.
-    It loads the function lazily and caches it.
+    It loads the function lazily and caches it, wrapped in a persistent
+    `CachedEmbeddingFunction` so identical documents are never re-embedded.
 
     The embedding model is chosen based on `config.embedding_model`.
-    Supported values: 'openai', 'qwen'. Defaults to 'openai'.
+    Supported values: 'openai', 'qwen', 'local'. Defaults to 'openai'.
     """
     global _embedding_function_cache
 
@@ -59,10 +199,23 @@ def get_embedding_function():
     embedding_model_name = getattr(config, 'embedding_model', 'openai').lower()
 
     if embedding_model_name == 'openai':
-        _embedding_function_cache = _get_openai_embedding_function()
+        embedding_function = _get_openai_embedding_function()
+        model_name = "openai/text-embedding-3-large"
     elif embedding_model_name == 'qwen':
-        _embedding_function_cache = _get_qwen_embedding_function()
+        embedding_function = _get_qwen_embedding_function()
+        model_name = f"qwen/{getattr(config, 'qwen_model_name', 'Qwen/Qwen3-Embedding-0.6B')}"
+    elif embedding_model_name == 'local':
+        embedding_function = _get_local_embedding_function()
+        model_name = f"local/{embedding_function.name()}-{config.local_embedding_dimensions}"
     else:
-        raise ValueError(f"Unsupported embedding model in config: '{embedding_model_name}'. Supported: 'openai', 'qwen'.")
-
-    return _embedding_function_cache
\ No newline at end of file
+        raise ValueError(f"Unsupported embedding model in config: '{embedding_model_name}'. "
+                         f"Supported: 'openai', 'qwen', 'local'.")
+
+    _embedding_function_cache = CachedEmbeddingFunction(
+        embedding_function,
+        model_name=model_name,
+        path=config.resolve_path(config.embedding_cache_path),
+        max_entries=config.embedding_cache_max_entries,
+        batch_size=config.embedding_batch_size,
+    )
+    return _embedding_function_cache
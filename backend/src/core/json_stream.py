@@ -0,0 +1,75 @@
+"""Incremental parsing of a JSON object streamed by an LLM in JSON mode."""
+import json
+
+
+class JSONFieldStream:
+    """
+    Follows a JSON object as it arrives in pieces and returns the decoded text of one top-level
+    string field as soon as it's known, e.g. the SQL of `{"sql_query": "SELECT ..."}` token by token.
+    Anything after the top-level object is ignored.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.value = ""  # decoded text of the field so far
+        self._ended = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = ""  # pending escape sequence, like "\\" or "\\u00"
+        self._expect_key = False
+        self._key = None  # last top-level key
+        self._key_buffer = []
+        self._in_field = False  # inside the string value of `field`
+
+    def feed(self, text: str) -> str:
+        """Consumes the next piece of the document, returns the new text of the field."""
+        delta = []
+        for char in text:
+            if self._ended:
+                break
+            if self._in_string:
+                self._feed_string(char, delta)
+                continue
+            if char == '"':
+                self._in_string = True
+                self._in_field = self._depth == 1 and not self._expect_key and self._key == self.field
+                continue
+            if char in "{[":
+                self._depth += 1
+                self._expect_key = char == "{" and self._depth == 1
+            elif char in "}]":
+                self._depth -= 1
+                self._ended = self._depth == 0
+            elif char == "," and self._depth == 1:
+                self._expect_key = True
+            elif char == ":" and self._depth == 1:
+                self._expect_key = False
+        text = "".join(delta)
+        self.value += text
+        return text
+
+    def _feed_string(self, char: str, delta: list):
+        if self._escape:
+            self._escape += char
+            if self._escape[1] == "u" and len(self._escape) < 6:
+                return
+            decoded = json.loads(f'"{self._escape}"')
+            self._escape = ""
+            self._append(decoded, delta)
+            return
+        if char == "\\":
+            self._escape = char
+        elif char == '"':
+            self._in_string = False
+            if self._depth == 1 and self._expect_key:
+                self._key = "".join(self._key_buffer)
+                self._key_buffer = []
+            self._in_field = False
+        else:
+            self._append(char, delta)
+
+    def _append(self, text: str, delta: list):
+        if self._in_field:
+            delta.append(text)
+        elif self._depth == 1 and self._expect_key:
+            self._key_buffer.append(text)
@@ -0,0 +1,109 @@
+"""
+Lexical index of the schema documents, next to the vector store.
+
+SQLite FTS5 with the trigram tokenizer, so identifiers match exactly or in parts ("cust_id", "invoice_line"),
+which embeddings often miss. Documents are ranked with BM25. The index is a cache of the Chroma collections:
+it is filled at index time and rebuilt from a collection when it's missing (e.g. on another host).
+"""
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.db import connect_sqlite
+
+_TERM = re.compile(r"[^\W_][\w$]*", re.UNICODE)
+
+
+def match_expression(query: str, min_length: int = 3) -> Optional[str]:
+    """FTS5 query matching any term of `query`, terms shorter than a trigram can't be matched."""
+    terms = {term.lower() for term in _TERM.findall(query) if len(term) >= min_length}
+    if not terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in sorted(terms))
+
+
+class LexicalIndex:
+    def __init__(self, path: str):
+        self._conn = connect_sqlite(path)
+        self._lock = threading.Lock()
+        try:
+            self._create("trigram")
+        except sqlite3.OperationalError:  # SQLite < 3.34, whole identifiers only
+            self._create("unicode61 tokenchars '_$'")
+
+    def _create(self, tokenizer: str):
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS schema_documents USING fts5("
+            "collection UNINDEXED, doc_id UNINDEXED, table_name UNINDEXED, column_line UNINDEXED, "
+            f"is_key UNINDEXED, content, tokenize = \"{tokenizer}\")"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS indexed_collections (collection TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    def has(self, collection: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM indexed_collections WHERE collection = ?", (collection,)).fetchone() is not None
+
+    def add(self, collection: str, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Indexes all documents of a collection at once, replacing what was indexed before."""
+        with self._lock:
+            self._conn.execute("DELETE FROM schema_documents WHERE collection = ?", (collection,))
+            self._conn.executemany(
+                "INSERT INTO schema_documents (collection, doc_id, table_name, column_line, is_key, content) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(collection, doc_id, meta.get("table_name"), meta.get("column_line"), int(bool(meta.get("is_key"))),
+                  document.replace("_", " ") + "\n" + document)  # words of identifiers rank on their own too
+                 for doc_id, document, meta in zip(ids, documents, metadatas)],
+            )
+            self._conn.execute("INSERT OR IGNORE INTO indexed_collections VALUES (?)", (collection,))
+            self._conn.commit()
+
+    def search(self, collection: str, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """(document id, BM25 score) of the best matches, best first."""
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, bm25(schema_documents) AS score FROM schema_documents "
+                "WHERE schema_documents MATCH ? AND collection = ? ORDER BY score LIMIT ?",
+                (expression, collection, n_results),
+            ).fetchall()
+        return [(doc_id, -score) for doc_id, score in rows]  # bm25() is lower for better matches
+
+    def documents(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Document id -> table name, column line and content."""
+        if not doc_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, table_name, column_line, is_key, content FROM schema_documents "
+                f"WHERE collection = ? AND doc_id IN ({', '.join('?' * len(doc_ids))})",
+                [collection, *doc_ids],
+            ).fetchall()
+        return {doc_id: {"table_name": table_name, "column_line": column_line, "is_key": bool(is_key),
+                         "document": content.split("\n", 1)[-1]}
+                for doc_id, table_name, column_line, is_key, content in rows}
+
+    def key_columns(self, collection: str, table_names: List[str]) -> Dict[str, List[str]]:
+        """Table name -> column lines of its primary and foreign keys, needed to join the tables."""
+        if not table_names:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT table_name, column_line FROM schema_documents "
+                f"WHERE collection = ? AND is_key = 1 AND table_name IN ({', '.join('?' * len(table_names))})",
+                [collection, *table_names],
+            ).fetchall()
+        keys = {}
+        for table_name, column_line in rows:
+            keys.setdefault(table_name, []).append(column_line)
+        return keys
+
+    def drop(self, collection: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM schema_documents WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM indexed_collections WHERE collection = ?", (collection,))
+            self._conn.commit()
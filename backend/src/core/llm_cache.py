@@ -0,0 +1,136 @@
+"""
+Response cache for deterministic (temperature 0) LLM calls.
+
+Plugs into LangChain's `BaseCache`, so LangChain computes the key parts itself:
+the prompt is the serialized message list and `llm_string` contains the model
+parameters together with bound tools / response format.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from src.core.db import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Two-level cache: in-memory LRU in front of a SQLite table.
+
+    Entries are keyed by (model key, sha256 of the prompt, sha256 of the llm string)
+    and expire after `ttl_seconds`. Both levels are bounded by entry count.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, memory_max_entries: int, disk_max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._memory = OrderedDict()  # key -> (created_at, generations)
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_last_used ON llm_responses (last_used)")
+        self._conn.commit()
+
+    def for_model(self, model_key: str) -> "ModelResponseCache":
+        return ModelResponseCache(self, model_key)
+
+    @staticmethod
+    def make_key(model_key: str, prompt: str, llm_string: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        llm_hash = hashlib.sha256(llm_string.encode("utf-8")).hexdigest()
+        return f"{model_key}:{prompt_hash}:{llm_hash}"
+
+    @property
+    def hit_ratio(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.get(self.make_key("", prompt, llm_string))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.put(self.make_key("", prompt, llm_string), return_val)
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            generations = [loads(gen) for gen in json.loads(row[0])]
+            self._remember(key, row[1], generations)
+            self.stats["disk_hits"] += 1
+            return generations
+
+    def put(self, key: str, return_val: RETURN_VAL_TYPE) -> None:
+        now = time.time()
+        response = json.dumps([dumps(gen) for gen in return_val])
+        with self._lock:
+            self._remember(key, now, return_val)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._conn.execute("DELETE FROM llm_responses WHERE created_at <= ?", (now - self.ttl_seconds,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+            if count > self.disk_max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_responses WHERE key IN "
+                    "(SELECT key FROM llm_responses ORDER BY last_used LIMIT ?)",
+                    (count - self.disk_max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+
+    def _remember(self, key: str, created_at: float, generations: RETURN_VAL_TYPE):
+        self._memory[key] = (created_at, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+
+class ModelResponseCache(BaseCache):
+    """View of `LLMResponseCache` that prefixes keys with a model key from `llms.models`."""
+
+    def __init__(self, cache: LLMResponseCache, model_key: str):
+        self.cache = cache
+        self.model_key = model_key
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.cache.get(self.cache.make_key(self.model_key, prompt, llm_string))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.cache.put(self.cache.make_key(self.model_key, prompt, llm_string), return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
@@ -0,0 +1,294 @@
+"""
+Routing layer in front of the configured LLM providers.
+
+`HedgedChatModel` sends the request to a primary model and, if it hasn't answered within
+the primary's observed p95 latency, sends a duplicate to a secondary model.
+Whichever answers first wins; the other one is cancelled (async) or abandoned (sync).
+
+`LimitedChatModel` admits calls to a model through its per-provider `FairLimiter`.
+Latencies and the hedge delay are counted from the moment the primary got its slot, so waiting
+in the local queue neither inflates the p95 nor triggers hedges. A hedge is only sent if the
+secondary has a free slot right away, it never queues.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
+from langchain_core.outputs import ChatResult, ChatGenerationChunk
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict
+from src.core.admission import AdmissionRejected, FairLimiter, current_thread_id
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+# set by HedgedChatModel for the calls it races: called once the call got its slot, and whether it may queue.
+_on_admitted: contextvars.ContextVar[Optional[Callable[[], None]]] = contextvars.ContextVar("on_admitted", default=None)
+_admission_wait: contextvars.ContextVar[bool] = contextvars.ContextVar("admission_wait", default=True)
+
+
+class LatencyTracker:
+    """Rolling window of latencies per model key."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_key: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model_key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model_key: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model_key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {"samples": len(self._samples[key]), "p50": self.percentile(key, 0.5), "p95": self.percentile(key, 0.95)}
+            for key in list(self._samples)
+        }
+
+
+latency_tracker = LatencyTracker()
+
+
+class _OpenAICompatibleChatModel(BaseChatModel):
+    """Base for wrappers around Cerebras/OpenAI models, forwards tools and response format to them."""
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        # both Cerebras and OpenAI models accept OpenAI formatted tools.
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def with_structured_output(self, schema=None, *, method="function_calling", include_raw=False, **kwargs):
+        if method != "json_mode":
+            return super().with_structured_output(schema, include_raw=include_raw, **kwargs)
+        if schema is None or isinstance(schema, dict):
+            parser = JsonOutputParser()
+        else:
+            parser = PydanticOutputParser(pydantic_object=schema)
+        return self.bind(response_format={"type": "json_object"}, **kwargs) | parser
+
+
+class LimitedChatModel(_OpenAICompatibleChatModel):
+    """Holds a slot of `limiter` for the duration of every call to `llm`."""
+    llm: BaseChatModel
+    limiter: FairLimiter
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return self.llm._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.llm._identifying_params
+
+    @contextmanager
+    def _slot(self):
+        with self.limiter.acquire(current_thread_id(), wait=_admission_wait.get()):
+            on_admitted = _on_admitted.get()
+            if on_admitted is not None:
+                on_admitted()
+            yield
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        with self._slot():
+            return self.llm._generate(messages, stop=stop, **kwargs)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        with self._slot():
+            yield from self.llm._stream(messages, stop=stop, **kwargs)
+
+
+class _Admission:
+    """Records when a raced call got its slot and notifies the race, which starts the hedge delay then."""
+
+    def __init__(self, notify: Callable[[], None]):
+        self.at = None
+        self._notify = notify
+
+    def __call__(self):
+        self.at = time.monotonic()
+        self._notify()
+
+
+class HedgedChatModel(_OpenAICompatibleChatModel):
+    """
+    Chat model that races a primary model against a secondary one.
+
+    The secondary request is only sent once the primary exceeded its p95 latency
+    (or `default_hedge_delay` until enough samples are collected).
+    For streaming, the race is on the first chunk, the winner then streams the rest.
+    """
+    primary: BaseChatModel
+    primary_key: str
+    secondary: Optional[BaseChatModel] = None
+    secondary_key: Optional[str] = None
+    default_hedge_delay: float = 5.0
+    tracker: LatencyTracker = latency_tracker
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"primary": self.primary_key, "secondary": self.secondary_key}
+
+    def hedge_delay(self, tracker_key: str) -> float:
+        p95 = self.tracker.percentile(tracker_key, 0.95)
+        return self.default_hedge_delay if p95 is None else p95
+
+    def _contenders(self):
+        yield self.primary_key, self.primary
+        if self.secondary is not None:
+            yield self.secondary_key, self.secondary
+
+    def _race(self, call, suffix: str = ""):
+        """
+        Runs `call(model)` on the primary, hedges to the secondary once the primary held its slot for
+        the p95 delay. A failed primary falls back to the secondary, which may then queue for a slot.
+        """
+        contenders = self._contenders()
+        futures = {}
+
+        def start(model_key, model, hedge: bool) -> threading.Event:
+            admitted = threading.Event()
+            admission = _Admission(admitted.set)
+            # copy the context so the callee still knows which graph run (thread_id) it serves.
+            context = contextvars.copy_context()
+            context.run(_on_admitted.set, admission)
+            context.run(_admission_wait.set, not hedge)
+
+            def run():
+                try:
+                    return call(model)
+                finally:
+                    admitted.set()
+
+            future = _executor.submit(context.run, run)
+
+            def on_done(f):
+                if not f.cancelled() and f.exception() is None and admission.at is not None:
+                    self.tracker.record(model_key + suffix, time.monotonic() - admission.at)
+
+            future.add_done_callback(on_done)
+            futures[future] = hedge
+            return admitted
+
+        primary_key, primary = next(contenders)
+        start(primary_key, primary, hedge=False).wait()
+        done, _ = wait(futures, timeout=self.hedge_delay(primary_key + suffix))
+        failed = bool(done) and next(iter(done)).exception() is not None
+        if not done or failed:
+            for model_key, model in contenders:
+                start(model_key, model, hedge=not failed)
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        # cancel only works if it hasn't started, otherwise its result is dropped.
+                        if not loser.cancel():
+                            loser.add_done_callback(_close_loser)
+                    return future.result()
+                if futures[future] and isinstance(future.exception(), AdmissionRejected):
+                    continue  # the secondary was busy, no hedge
+                error = error or future.exception()
+        raise error
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        return self._race(lambda model: model._generate(messages, stop=stop, **kwargs))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        def first_chunk(model):
+            iterator = model._stream(messages, stop=stop, **kwargs)
+            return next(iterator), iterator
+
+        chunk, iterator = self._race(first_chunk, suffix=":stream")
+        yield chunk
+        yield from iterator
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        loop = asyncio.get_running_loop()
+        tasks = {}
+
+        def start(model_key, model, hedge: bool) -> asyncio.Event:
+            admitted = asyncio.Event()
+            # called from the executor thread of the sync call.
+            admission = _Admission(lambda: loop.call_soon_threadsafe(admitted.set))
+
+            async def timed():
+                # the task runs in its own copy of the context.
+                _on_admitted.set(admission)
+                _admission_wait.set(not hedge)
+                try:
+                    result = await model._agenerate(messages, stop=stop, **kwargs)
+                finally:
+                    admitted.set()
+                if admission.at is not None:
+                    self.tracker.record(model_key, time.monotonic() - admission.at)
+                return result
+
+            tasks[asyncio.create_task(timed())] = hedge
+            return admitted
+
+        contenders = self._contenders()
+        primary_key, primary = next(contenders)
+        await start(primary_key, primary, hedge=False).wait()
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary_key))
+        failed = bool(done) and next(iter(done)).exception() is not None
+        if not done or failed:
+            for model_key, model in contenders:
+                start(model_key, model, hedge=not failed)
+
+        error = None
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    if tasks[task] and isinstance(task.exception(), AdmissionRejected):
+                        continue  # the secondary was busy, no hedge
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def _close_loser(future):
+    """Closes the stream of a losing streaming contender."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if isinstance(result, tuple) and hasattr(result[-1], "close"):
+        result[-1].close()
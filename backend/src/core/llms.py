@@ -1,6 +1,9 @@
 from langchain_cerebras import ChatCerebras
 from langchain_openai import ChatOpenAI
 from src.core.config import config  # noqa
+from src.core.llm_cache import LLMResponseCache
+from src.core.admission import llm_limiter
+from src.core.llm_router import HedgedChatModel, LimitedChatModel
 
 models = {  # not separating by providers but rather by LLMs themselves for possible future comparison.
     "gpt-4.1": ChatOpenAI(  # favorite.
@@ -51,8 +54,63 @@ models = {  # not separating by providers but rather by LLMs themselves for poss
 }
 
 
-def get_llm(stream=True):
-    if not stream:
-        return models["qwen-3-235b-a22b-instruct-2507-no-streaming"]
-    llm = models[config.default_llm_model]
+# secondary model that gets a hedged duplicate request when the primary is slower than its p95.
+hedge_fallbacks = {
+    "qwen-3-235b-a22b-instruct-2507-no-streaming": "gpt-4.1-no-stream",
+    "qwen-3-235b-a22b-instruct-2507": "gpt-4.1",
+    "gpt-4.1-no-stream": "qwen-3-235b-a22b-instruct-2507-no-streaming",
+    "gpt-4.1": "qwen-3-235b-a22b-instruct-2507",
+}
+
+llm_response_cache = LLMResponseCache(
+    path=config.resolve_path(config.llm_cache_path),
+    ttl_seconds=config.llm_cache_ttl_seconds,
+    memory_max_entries=config.llm_cache_memory_max_entries,
+    disk_max_entries=config.llm_cache_disk_max_entries,
+) if config.llm_cache_enabled else None
+
+_built_models = {}
+
+
+def _streaming_disabled(llm) -> bool:
+    return llm.disable_streaming or ("streaming" in llm.model_fields_set and not llm.streaming)
+
+
+def _limited(model_key: str):
+    llm = models[model_key]
+    return LimitedChatModel(llm=llm, limiter=llm_limiter(model_key), disable_streaming=_streaming_disabled(llm))
+
+
+def _build_llm(model_key: str, cache: bool):
+    llm = _limited(model_key)
+    secondary_key = hedge_fallbacks.get(model_key)
+    if config.llm_hedging_enabled and secondary_key:
+        llm = HedgedChatModel(
+            primary=llm,
+            primary_key=model_key,
+            secondary=_limited(secondary_key),
+            secondary_key=secondary_key,
+            default_hedge_delay=config.llm_hedge_default_delay_seconds,
+            disable_streaming=llm.disable_streaming,
+        )
+    if cache:
+        llm = llm.model_copy(update={"cache": llm_response_cache.for_model(model_key)})
     return llm
+
+
+def get_llm(stream=True, cache=False, model_key=None):
+    """
+    Returns the configured model, admitted through its per-provider concurrency limiter.
+
+    Args:
+        stream: whether the model should stream tokens.
+        cache: use the response cache (if `config.llm_cache_enabled`).
+            Only meant for deterministic (temperature 0) calls, like schema summaries and DBA generation.
+        model_key: a key of `models` instead of the default one.
+    """
+    if model_key is None:
+        model_key = "qwen-3-235b-a22b-instruct-2507-no-streaming" if not stream else config.default_llm_model
+    cache = cache and llm_response_cache is not None
+    if (model_key, cache) not in _built_models:
+        _built_models[(model_key, cache)] = _build_llm(model_key, cache)
+    return _built_models[(model_key, cache)]
@@ -0,0 +1,99 @@
+"""
+Local embeddings of schema documents, without a model or network.
+
+Words, identifier parts ("customer_id" -> "customer", "id"), word bigrams and character 3-5-grams are hashed
+into a fixed number of buckets and weighted like TF-IDF: sublinear term frequency times a fixed inverse
+document frequency per feature kind (longer n-grams are rarer, so they weigh more). A fitted IDF would make
+a vector depend on the rest of the corpus, while vectors are cached per document and queries are embedded
+alone. The words every schema document repeats ("Table name", "Columns", "type") are left out instead.
+Character n-grams of a whole batch are hashed at once in NumPy, a few thousand documents take a fraction
+of a second.
+"""
+import re
+import zlib
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+_TOKEN = re.compile(r"[^\W_]+(?:_[^\W_]+)*", re.UNICODE)
+# the template of the table and column documents, in every document
+_BOILERPLATE = frozenset({"table", "name", "columns", "column", "type", "primary", "key", "references"})
+
+# inverse document frequency of each kind of feature
+_IDF = {"word": 2.0, "part": 1.5, "bigram": 2.5, 3: 1.0, 4: 1.3, 5: 1.6}
+
+_PRIME = np.uint64(1_000_003)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+@lru_cache(maxsize=100_000)
+def _bucket(kind: str, text: str, dimensions: int) -> int:
+    """Schema documents repeat the same words a lot, each is hashed once."""
+    return zlib.crc32(f"{kind}:{text}".encode("utf-8")) % dimensions
+
+
+class LocalEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+
+    @staticmethod
+    def name() -> str:
+        return "local_hashed_tfidf"
+
+    def get_config(self) -> Dict[str, int]:
+        return {"dimensions": self.dimensions}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, int]) -> "LocalEmbeddingFunction":
+        return LocalEmbeddingFunction(**config)
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if not input:
+            return []
+        tokens = [[t for t in _TOKEN.findall(doc.lower()) if t not in _BOILERPLATE] for doc in input]
+        features = {**self._word_features(tokens), **self._char_features(
+            [" " + " ".join(t.replace("_", " ") for t in doc_tokens) + " " for doc_tokens in tokens])}
+        cells, weights = [], []  # flat (document, bucket) index and its TF-IDF weight
+        for kind, (docs, buckets) in features.items():
+            cell, count = np.unique(docs * self.dimensions + buckets, return_counts=True)
+            cells.append(cell)
+            weights.append(_IDF[kind] * np.log1p(count))  # sublinear term frequency
+        vectors = np.bincount(np.concatenate(cells), weights=np.concatenate(weights),
+                              minlength=len(input) * self.dimensions).reshape(len(input), self.dimensions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return list((vectors / np.where(norms > 0, norms, 1)).astype(np.float32))
+
+    def _word_features(self, tokens: List[List[str]]) -> Dict[str, tuple]:
+        features = {"word": ([], []), "part": ([], []), "bigram": ([], [])}
+        for doc, doc_tokens in enumerate(tokens):
+            parts = [part for token in doc_tokens if "_" in token for part in token.split("_")]
+            bigrams = [f"{a} {b}" for a, b in zip(doc_tokens, doc_tokens[1:])]
+            for kind, texts in (("word", doc_tokens), ("part", parts), ("bigram", bigrams)):
+                features[kind][0].extend([doc] * len(texts))
+                features[kind][1].extend(texts)
+        return {kind: (np.asarray(docs, dtype=np.int64),
+                       np.fromiter((_bucket(kind, text, self.dimensions) for text in texts), np.int64, len(texts)))
+                for kind, (docs, texts) in features.items()}
+
+    def _char_features(self, texts: List[str]) -> Dict[int, tuple]:
+        """Polynomial hashes of all character n-grams of the batch, n-grams across two documents are dropped."""
+        encoded = [text.encode("utf-8") for text in texts]
+        codes = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        doc_of = np.repeat(np.arange(len(texts)), [len(e) for e in encoded])
+        features = {}
+        for n in (3, 4, 5):
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, n, dtype=np.uint64)
+            for i in range(n):  # wraps around on overflow, like any 64-bit hash
+                hashes = hashes * _PRIME + codes[i:i + count]
+            within = doc_of[:count] == doc_of[n - 1:n - 1 + count]
+            buckets = ((hashes * _GOLDEN) >> np.uint64(32)) % np.uint64(self.dimensions)
+            features[n] = (doc_of[:count][within], buckets[within].astype(np.int64))
+        return features
@@ -0,0 +1,119 @@
+"""
+Approximate previews of queries over huge tables.
+
+Tables read in FROM clauses are replaced by a sample of them: dialect-native sampling (TABLESAMPLE / SAMPLE)
+where the dialect has it, otherwise a bounded scan of the first `max_scan_rows` rows. Joined tables are read
+fully, so joins to dimension tables stay complete. Aggregates are computed over the sample as is, counts and
+sums have to be scaled by 100 / `sample_percent` to estimate the exact value.
+"""
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from src.core.sql_analysis import DIALECTS
+
+# sampled derived tables per sqlglot dialect, `table` is the original table reference.
+_NATIVE_SAMPLES = {
+    "postgres": "(SELECT * FROM {table} TABLESAMPLE SYSTEM ({percent}))",
+    "oracle": "(SELECT * FROM {table} SAMPLE ({percent}))",
+    "clickhouse": "(SELECT * FROM {table} SAMPLE {ratio})",  # only tables with a sampling key
+}
+_BOUNDED_SCANS = {
+    "oracle": "(SELECT * FROM {table} FETCH FIRST {rows} ROWS ONLY)",
+}
+_BOUNDED_SCAN = "(SELECT * FROM {table} LIMIT {rows})"
+
+
+@dataclass
+class Preview:
+    sql: str
+    method: str  # "tablesample" or "bounded_scan"
+    sample_percent: Optional[float]  # for "tablesample"
+    row_limit: Optional[int]  # rows read per sampled table, for "bounded_scan"
+
+    @property
+    def info(self) -> dict:
+        """What the client and the LLM are told about the approximation."""
+        info = {k: v for k, v in asdict(self).items() if k != "sql"}
+        if self.method == "tablesample":
+            info["note"] = (f"Computed over a {self.sample_percent}% sample, "
+                            f"multiply counts and sums by {round(100 / self.sample_percent, 4)} to estimate them.")
+        else:
+            info["note"] = f"Computed over at most {self.row_limit} rows per table, the result may be incomplete."
+        return info
+
+
+def _unqualify_columns(statement: exp.Expression, tables: set):
+    """
+    `schema.table.column` references to sampled tables become `table.column`,
+    the derived table that replaces them is only known by the bare table name.
+    """
+    if not tables:
+        return
+    for column in statement.find_all(exp.Column):
+        if not column.db:
+            continue
+        db, name = column.db.lower(), column.table.lower()
+        if any(db == t_db and name == t_name and (not column.catalog or column.catalog.lower() == t_catalog)
+               for t_catalog, t_db, t_name in tables):
+            column.set("db", None)
+            column.set("catalog", None)
+
+
+def preview_sql(sql: str, engine: str, sample_percent: float, max_scan_rows: int,
+                bounded: bool = False) -> Optional[Preview]:
+    """
+    Rewrites `sql` to read samples of its tables, with a bounded scan if `bounded` is set or the dialect
+    has no native sampling. Returns None if there is nothing to sample or the query can't be rewritten.
+    """
+    dialect = DIALECTS.get(engine)
+    try:
+        statement = sqlglot.parse_one(sql, read=dialect)
+    except ParseError:
+        return None
+
+    if bounded or dialect not in _NATIVE_SAMPLES:
+        method, template = "bounded_scan", _BOUNDED_SCANS.get(dialect, _BOUNDED_SCAN)
+    else:
+        method, template = "tablesample", _NATIVE_SAMPLES[dialect]
+
+    cte_names = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+    token = uuid.uuid4().hex[:8]
+    replacements = {}
+    qualified = set()  # (catalog, db, name) of sampled tables that are referred to by name
+    for from_ in list(statement.find_all(exp.From)):
+        table = from_.this
+        if (not isinstance(table, exp.Table) or not table.name or table.args.get("sample")
+                or table.name.lower() in cte_names):
+            continue
+        # placeholders are swapped for the sampled derived table after generation,
+        # sqlglot doesn't need to understand every dialect's sampling syntax.
+        placeholder = f"preview{len(replacements)}_{token}"
+        source = table.copy()
+        source.set("alias", None)
+        replacements[placeholder] = template.format(
+            table=source.sql(dialect=dialect),
+            percent=sample_percent,
+            ratio=sample_percent / 100,
+            rows=max_scan_rows,
+        )
+        if not table.alias and table.db:
+            qualified.add((table.catalog.lower(), table.db.lower(), table.name.lower()))
+        table.replace(exp.alias_(exp.to_table(placeholder), table.alias_or_name, table=True))
+    if not replacements:
+        return None
+    _unqualify_columns(statement, qualified)
+
+    rewritten = statement.sql(dialect=dialect)
+    for placeholder, derived_table in replacements.items():
+        for quoted in (f'"{placeholder}"', f"`{placeholder}`", placeholder):
+            rewritten = rewritten.replace(quoted, derived_table)
+    return Preview(
+        sql=rewritten,
+        method=method,
+        sample_percent=sample_percent if method == "tablesample" else None,
+        row_limit=max_scan_rows if method == "bounded_scan" else None,
+    )
@@ -0,0 +1,169 @@
+"""
+Opt-in wall-clock profiling of single requests.
+
+A profiled request records spans for the request itself, graph nodes, tools, LLM calls and SQL
+statements, with the thread they ran on, and saves them as a Chrome trace
+(open in chrome://tracing or https://ui.perfetto.dev) under `profiles/<thread_id>/<request_id>.json`.
+Nothing is registered until the first profiled request, so there is no overhead when profiling is off.
+"""
+import json
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.core.config import config
+
+PROFILES_DIR = Path(config.resolve_path("profiles"))
+
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+_sql_listeners_registered = False
+_sql_listeners_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self, thread_id: str, request_id: str, name: str):
+        self.thread_id = thread_id
+        self.request_id = request_id
+        self.name = name
+        self._started = time.perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def now_us(self) -> float:
+        return (time.perf_counter() - self._started) * 1e6
+
+    def add_span(self, name: str, category: str, start_us: float, end_us: float, **args):
+        with self._lock:
+            self._events.append({
+                "name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": start_us, "dur": max(end_us - start_us, 0), "args": args,
+            })
+
+    def save(self) -> Path:
+        self.add_span(self.name, "request", 0, self.now_us())
+        path = PROFILES_DIR / self.thread_id / f"{self.request_id}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            events = list(self._events)
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms",
+                                    "otherData": {"thread_id": self.thread_id, "request_id": self.request_id}},
+                                   default=str))
+        return path
+
+
+class ProfilingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain/LangGraph run events into spans of the profile."""
+
+    def __init__(self, profile: RequestProfile):
+        self.profile = profile
+        self._runs: Dict[UUID, tuple] = {}
+
+    def _start(self, run_id: UUID, name: str, category: str):
+        self._runs[run_id] = (name, category, self.profile.now_us())
+
+    def _end(self, run_id: UUID, **args):
+        started = self._runs.pop(run_id, None)
+        if started is not None:
+            name, category, start_us = started
+            self.profile.add_span(name, category, start_us, self.profile.now_us(), **args)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        self._start(run_id, node if node == name else name, "node" if node else "chain")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, (serialized or {}).get("name") or kwargs.get("name") or "tool", "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, kwargs.get("name") or "chat_model", "llm")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, kwargs.get("name") or "llm", "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None:
+        conn.info.setdefault("profile_starts", []).append(profile.now_us())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    starts = conn.info.get("profile_starts")
+    if profile is not None and starts:
+        profile.add_span("sql", "sql", starts.pop(), profile.now_us(), statement=statement[:2000])
+
+
+def _register_sql_listeners():
+    global _sql_listeners_registered
+    with _sql_listeners_lock:
+        if not _sql_listeners_registered:
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            _sql_listeners_registered = True
+
+
+def profiling_enabled() -> bool:
+    return bool(config.profiling_admin_token) or config.profiling_sample_rate > 0
+
+
+def should_profile(token: Optional[str]) -> bool:
+    if config.profiling_admin_token and token == config.profiling_admin_token:
+        return True
+    return config.profiling_sample_rate > 0 and random.random() < config.profiling_sample_rate
+
+
+def start_profile(thread_id: str, request_id: str, name: str) -> RequestProfile:
+    _register_sql_listeners()
+    profile = RequestProfile(thread_id, request_id, name)
+    current_profile.set(profile)
+    return profile
+
+
+def profiling_callbacks() -> list:
+    """Callback handlers to add to a graph run, empty when the current request isn't profiled."""
+    profile = current_profile.get()
+    return [] if profile is None else [ProfilingCallbackHandler(profile)]
+
+
+def list_profiles(thread_id: str) -> List[str]:
+    directory = PROFILES_DIR / thread_id
+    if not directory.is_dir():
+        return []
+    return sorted(p.stem for p in directory.glob("*.json"))
+
+
+def profile_path(thread_id: str, request_id: str) -> Optional[Path]:
+    path = PROFILES_DIR / thread_id / f"{request_id}.json"
+    # ids come from the url, don't let them escape the profiles directory.
+    if path.resolve().parent != (PROFILES_DIR / thread_id).resolve() or not path.is_file():
+        return None
+    return path
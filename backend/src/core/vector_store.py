@@ -1,17 +1,95 @@
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from pathlib import Path
+
 import chromadb
+from filelock import Timeout
+from src.core.config import config
+from src.core.db import connect_sqlite, process_lock
 from src.core.embeddings import get_embedding_function
-from typing import List, Dict, Any
+from src.core.lexical_index import LexicalIndex
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
 
 # Define a path for the persistent storage of the vector store
-CHROMA_DB_PATH = "./chroma_db"
+CHROMA_DB_PATH = config.resolve_path(config.chroma_path)
+# Keeps track of which schema collection each thread uses and when it was last touched.
+THREAD_REGISTRY_PATH = str(Path(CHROMA_DB_PATH) / "threads.sqlite")
+LEXICAL_INDEX_PATH = str(Path(CHROMA_DB_PATH) / "lexical.sqlite")
+# the single collection of all threads, before collections were per schema. Nothing reads it anymore.
+LEGACY_COLLECTION_NAME = "database_schema_details"
+# part of the collection fingerprint, bump it when the documents or their metadata change.
+DOCUMENTS_VERSION = 2
+
+_client = None
+_client_lock = threading.Lock()
+_registry_conn = None
+_registry_lock = threading.Lock()
+_gc_thread = None
+_legacy_collection_dropped = False
+_lexical_index = None
+_lexical_index_lock = threading.Lock()
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="schema-search")
 
 
 def get_chroma_client():
     """
-    Initializes and returns a persistent ChromaDB client.
+    Returns the process-wide ChromaDB client, creating it on first use.
+    It's an embedded persistent client, or an HTTP client if `config.chroma_server_host` is set
+    (the embedded one isn't safe to share between worker processes).
+    Also starts the background GC of expired threads.
+    """
+    global _client, _gc_thread
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            if config.chroma_server_host:
+                _client = chromadb.HttpClient(host=config.chroma_server_host, port=config.chroma_server_port)
+            else:
+                _client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+            _gc_thread = threading.Thread(target=_gc_loop, name="vector-store-gc", daemon=True)
+            _gc_thread.start()
+    return _client
+
+
+def _get_registry():
+    global _registry_conn
+    if _registry_conn is None:
+        conn = connect_sqlite(THREAD_REGISTRY_PATH)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS threads ("
+            "thread_id TEXT PRIMARY KEY, collection_name TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS threads_collection ON threads (collection_name)")
+        conn.commit()
+        _registry_conn = conn
+    return _registry_conn
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _lexical_index
+    with _lexical_index_lock:
+        if _lexical_index is None:
+            Path(CHROMA_DB_PATH).mkdir(parents=True, exist_ok=True)
+            _lexical_index = LexicalIndex(LEXICAL_INDEX_PATH)
+    return _lexical_index
+
+
+def schema_collection_name(prefix: str, documents: List[str]) -> str:
+    """
+    Builds a collection name from a fingerprint of the schema documents and the embedding model,
+    so every database with the same schema shares one collection.
     """
-    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    return client
+    digest = hashlib.sha256(f"{get_embedding_function().model_name}\0{DOCUMENTS_VERSION}".encode())
+    for doc in sorted(documents):
+        digest.update(doc.encode("utf-8"))
+        digest.update(b"\0")
+    return f"{prefix}_{digest.hexdigest()[:32]}"
 
 
 def get_or_create_collection(collection_name: str):
@@ -36,7 +114,8 @@ def get_or_create_collection(collection_name: str):
 
 def add_documents(collection_name: str, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str], thread_id: str):
     """
-    Adds documents to a specified collection, associating them with a thread_id.
+    Adds documents to a specified collection and registers the collection for a thread_id.
+    Documents that are already in the collection (indexed by another thread or worker) are skipped.
 
     Args:
         collection_name (str): The name of the collection.
@@ -45,30 +124,63 @@ def add_documents(collection_name: str, documents: List[str], metadatas: List[Di
         ids (List[str]): A list of unique IDs for the documents.
         thread_id (str): The identifier for the user or conversation thread.
     """
-    collection = get_or_create_collection(collection_name)
+    # workers indexing the same schema wait for the first one instead of embedding it again.
+    with process_lock(collection_name):
+        collection = get_or_create_collection(collection_name)
+
+        existing_ids = set(collection.get(ids=ids, include=[])["ids"])
+        new = [i for i, doc_id in enumerate(ids) if doc_id not in existing_ids]
+        if new:
+            collection.add(
+                documents=[documents[i] for i in new],
+                metadatas=[metadatas[i] for i in new],
+                ids=[ids[i] for i in new]
+            )
+        if new or not get_lexical_index().has(collection_name):
+            get_lexical_index().add(collection_name, ids, documents, metadatas)
+        # registered before the lock is released, so the GC never sees the collection unused.
+        register_thread(thread_id, collection_name)
 
-    # Create a copy of the metadatas and add the thread_id to each one
-    updated_metadatas = []
-    for metadata in metadatas:
-        new_meta = metadata.copy()
-        new_meta['thread_id'] = thread_id
-        updated_metadatas.append(new_meta)
-
-    collection.add(
-        documents=documents,
-        metadatas=updated_metadatas,
-        ids=ids
-    )
 
+def register_thread(thread_id: str, collection_name: str):
+    """Associates a thread with a schema collection, or refreshes its last usage time."""
+    with _registry_lock:
+        conn = _get_registry()
+        conn.execute(
+            "INSERT OR REPLACE INTO threads (thread_id, collection_name, last_used) VALUES (?, ?, ?)",
+            (thread_id, collection_name, time.time()),
+        )
+        conn.commit()
 
-def query_collection(collection_name: str, query_texts: List[str], thread_id: str, n_results: int = 5) -> Dict[str, Any]:
+
+def touch_thread(thread_id: str):
+    """Marks a thread as used, so its collection isn't collected while the conversation goes on."""
+    with _registry_lock:
+        conn = _get_registry()
+        conn.execute("UPDATE threads SET last_used = ? WHERE thread_id = ?", (time.time(), thread_id))
+        conn.commit()
+
+
+def get_thread_collection_name(thread_id: str) -> Optional[str]:
+    """Returns the schema collection of a thread and marks the thread as used, or None if it's unknown/expired."""
+    with _registry_lock:
+        conn = _get_registry()
+        row = conn.execute("SELECT collection_name FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE threads SET last_used = ? WHERE thread_id = ?", (time.time(), thread_id))
+        conn.commit()
+    return row[0]
+
+
+def query_collection(collection_name: str, query_texts: List[str], n_results: int = 5) -> Dict[str, Any]:
     """
-    Queries a collection to find similar documents, filtered by thread_id.
+    Queries a collection to find similar documents.
+    Collections are per schema, so no per-thread filtering is needed.
 
     Args:
         collection_name (str): The name of the collection.
         query_texts (List[str]): The query texts to search for.
-        thread_id (str): The identifier for the user or conversation thread to filter by.
         n_results (int): The number of results to return.
 
     Returns:
@@ -76,10 +188,168 @@ def query_collection(collection_name: str, query_texts: List[str], thread_id: st
     """
     collection = get_or_create_collection(collection_name)
 
-    # Use the 'where' filter to scope the search to the given thread_id
     results = collection.query(
         query_texts=query_texts,
-        n_results=n_results,
-        where={"thread_id": thread_id}
+        n_results=min(n_results, collection.count()) or 1,
     )
-    return results
\ No newline at end of file
+    return results
+
+
+def _ensure_lexical_index(collection_name: str):
+    """Rebuilds the lexical index of a collection from its documents, e.g. indexed on another host."""
+    if get_lexical_index().has(collection_name):
+        return
+    with process_lock(collection_name):
+        if get_lexical_index().has(collection_name):
+            return
+        results = get_or_create_collection(collection_name).get(include=["documents", "metadatas"])
+        get_lexical_index().add(collection_name, results["ids"], results["documents"], results["metadatas"])
+
+
+def _rrf(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """Reciprocal rank fusion: scores of the lists aren't comparable, their ranks are."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank + 1)
+    return scores
+
+
+def search_schema(collection_name: str, query: str, n_tables: int, n_columns: int,
+                  budget_ms: float) -> List[Dict[str, Any]]:
+    """
+    Hybrid search over the table and column documents of a schema collection.
+    Lexical (BM25 over trigrams) and vector rankings are fused by rank. The vector search gets what is left
+    of `budget_ms` after the lexical one, it's skipped if it takes longer.
+
+    Returns:
+        List[Dict[str, Any]]: the best `n_tables` tables, best first, as {"table_name", "score", "document"
+        (if none of its columns matched), "columns" (up to `n_columns` matched column lines and the keys)}.
+    """
+    started = time.monotonic()
+    candidates = config.schema_search_candidates
+    collection = get_or_create_collection(collection_name)
+    vector_future = _search_executor.submit(
+        collection.query, query_texts=[query], n_results=min(candidates, collection.count()) or 1, include=[],
+    )
+
+    _ensure_lexical_index(collection_name)
+    lexical_index = get_lexical_index()
+    rankings = [[doc_id for doc_id, _ in lexical_index.search(collection_name, query, candidates)]]
+    remaining = budget_ms / 1000 - (time.monotonic() - started)
+    try:
+        rankings.append(vector_future.result(timeout=max(remaining, 0))["ids"][0])
+    except FuturesTimeout:
+        logger.info("Vector schema search exceeded %s ms, using lexical results only.", budget_ms)
+    scores = _rrf(rankings)
+
+    documents = lexical_index.documents(collection_name, list(scores))
+    tables = {}
+    for doc_id in sorted(scores, key=scores.get, reverse=True):
+        doc = documents.get(doc_id)
+        if doc is None or not doc["table_name"]:
+            continue
+        table = tables.setdefault(doc["table_name"], {
+            "table_name": doc["table_name"], "score": scores[doc_id], "document": None, "columns": [],
+        })
+        if doc_id.startswith("table_"):
+            table["document"] = doc["document"]
+        elif len(table["columns"]) < n_columns:
+            table["columns"].append(doc["column_line"])
+    best = sorted(tables.values(), key=lambda t: t["score"], reverse=True)[:n_tables]
+
+    keys = lexical_index.key_columns(collection_name, [t["table_name"] for t in best])
+    for table in best:
+        if not table["columns"]:
+            continue  # the whole table document is returned
+        table["document"] = None
+        table["columns"] += [line for line in keys.get(table["table_name"], []) if line not in table["columns"]]
+    return best
+
+
+def get_value_profiles(collection_name: str, table_keys: List[str]) -> Dict[str, str]:
+    """
+    Returns the stored value profiles of the given tables.
+
+    Args:
+        collection_name (str): The name of the schema collection.
+        table_keys (List[str]): Lowercased table names, unknown ones are ignored.
+
+    Returns:
+        Dict[str, str]: table name -> value profile, only for tables that have one.
+    """
+    if not table_keys:
+        return {}
+    collection = get_or_create_collection(collection_name)
+    # only the table documents, not the column documents of the same tables.
+    results = collection.get(where={"$and": [{"document": "table"}, {"table_key": {"$in": table_keys}}]},
+                             include=["metadatas"])
+    return {
+        meta["table_name"]: meta["value_profile"]
+        for meta in results["metadatas"] if meta.get("value_profile")
+    }
+
+
+def collect_garbage(ttl_seconds: float) -> int:
+    """
+    Forgets threads that weren't used for `ttl_seconds` and drops collections no thread refers to anymore.
+    Each collection is checked again under its indexing lock, so one that is being (re)built or was just
+    registered by another thread or worker is kept. Collections locked by indexing are skipped this round.
+
+    Returns:
+        int: The number of dropped collections.
+    """
+    client = get_chroma_client()
+    _drop_legacy_collection(client)
+    with _registry_lock:
+        candidates = {row[0] for row in _get_registry().execute(
+            "SELECT DISTINCT collection_name FROM threads WHERE last_used < ?", (time.time() - ttl_seconds,))}
+
+    dropped = 0
+    for collection_name in candidates:
+        try:
+            with process_lock(collection_name, timeout=0):
+                with _registry_lock:
+                    conn = _get_registry()
+                    conn.execute("DELETE FROM threads WHERE collection_name = ? AND last_used < ?",
+                                 (collection_name, time.time() - ttl_seconds))
+                    conn.commit()
+                    in_use = conn.execute(
+                        "SELECT 1 FROM threads WHERE collection_name = ? LIMIT 1", (collection_name,)).fetchone()
+                if in_use:
+                    continue
+                client.delete_collection(collection_name)
+                get_lexical_index().drop(collection_name)
+                dropped += 1
+        except Timeout:
+            continue
+        except Exception as e:  # already deleted by another process, etc.
+            logger.warning("Failed to drop collection %s: %s", collection_name, e)
+    if dropped:
+        logger.info("Vector store GC dropped %d collections.", dropped)
+    return dropped
+
+
+def _drop_legacy_collection(client):
+    global _legacy_collection_dropped
+    if _legacy_collection_dropped:
+        return
+    try:
+        client.delete_collection(LEGACY_COLLECTION_NAME)
+        logger.info("Dropped the legacy collection %s.", LEGACY_COLLECTION_NAME)
+    except Exception:  # doesn't exist
+        pass
+    _legacy_collection_dropped = True
+
+
+def _gc_loop():
+    while True:
+        time.sleep(config.vector_gc_interval_seconds)
+        try:
+            # one worker collects, the others skip this round.
+            with process_lock("vector-store-gc", timeout=0):
+                collect_garbage(config.vector_thread_ttl_hours * 3600)
+        except Timeout:
+            continue
+        except Exception as e:
+            logger.exception(e)
@@ -0,0 +1,150 @@
+"""
+Shared web search client.
+
+One keep-alive `httpx.AsyncClient` lives on the side event loop of `run_async`, so sync tools and the
+async API share the same connection pool. Results are cached by normalized query for `ttl_seconds`
+and concurrent searches of the same query wait for a single request.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import httpx
+from src.core.config import config
+from src.core.utils import run_async
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+class WebSearchClient:
+    def __init__(self, url: str, api_key: str, timeout: float, max_connections: int,
+                 ttl_seconds: int, max_entries: int, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.transport = transport  # None - the network, tests pass an in-process one
+        self.stats = {"hits": 0, "misses": 0, "deduplicated": 0, "errors": 0}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache = OrderedDict()  # normalized query -> (created_at, results)
+        self._in_flight: Dict[str, asyncio.Future] = {}  # only touched on the side loop
+        self._lock = threading.Lock()
+
+    def search_sync(self, query: str) -> List[dict]:
+        """Search from sync code, e.g. tools of the graph."""
+        key = normalize_query(query)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+        return run_async(self._search(key, query))
+
+    async def search(self, query: str) -> List[dict]:
+        key = normalize_query(query)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(run_async, self._search(key, query))
+
+    def close(self):
+        """Close the connection pool, called on app shutdown."""
+        if self._client is not None:
+            run_async(self._close())
+
+    def _get_cached(self, key: str) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                return None
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def _put_cached(self, key: str, results: List[dict]):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    async def _search(self, key: str, query: str) -> List[dict]:
+        # runs on the side loop only, so the in-flight map needs no lock
+        cached = self._get_cached(key)  # filled while this call was queued
+        if cached is not None:
+            return cached
+        if key in self._in_flight:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.stats["misses"] += 1
+        try:
+            results = await self._fetch(query)
+            future.set_result(results)
+            return results
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # nobody may be waiting, don't log "exception was never retrieved"
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _fetch(self, query: str) -> List[dict]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Accept": "application/json",
+                    "X-Respond-With": "no-content",
+                },
+            )
+        try:
+            # can also use country to suit the results for the locale of the user.
+            response = await self._client.get(
+                url=self.url,
+                params={
+                    "q": query,
+                    # "gl": "JP" # location # has limited list though
+                    # "hl": "kz" # language # has limited list too.
+                },
+            )
+            response.raise_for_status()
+            search_results = response.json()['data']
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            self.stats["errors"] += 1
+            logger.exception(e)
+            return []  # failures aren't cached
+
+        results = [{"description": r['description'], "date": r.get('date', "no date")}
+                   for r in search_results or []]
+        self._put_cached(normalize_query(query), results)
+        return results
+
+    async def _close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+web_search_client = WebSearchClient(
+    url=config.web_search_url,
+    api_key=config.jina_api_key,
+    timeout=config.web_search_timeout_seconds,
+    max_connections=config.web_search_max_connections,
+    ttl_seconds=config.web_search_cache_ttl_seconds,
+    max_entries=config.web_search_cache_max_entries,
+)
@@ -0,0 +1,129 @@
+"""
+Local workspace of recent query results, one SQLite database per thread.
+
+Follow-ups like "now only 2023" or "sort that by revenue" can be answered by querying
+the previous results locally instead of sending a new query to the customer's database.
+"""
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.core.config import config
+
+
+class _ThreadWorkspace:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.tables: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # name -> description, oldest first
+        self.counter = 0
+
+
+class ResultWorkspace:
+    """
+    Keeps the last `max_results` results of every thread, results above `max_rows` rows aren't kept.
+    At most `max_threads` workspaces are alive, the least recently used one is dropped first.
+    With `directory` set, workspaces are files there (shared by workers), otherwise they live in memory.
+    """
+
+    def __init__(self, max_results: int, max_rows: int, max_threads: int, directory: Optional[str] = None):
+        self.max_results = max_results
+        self.max_rows = max_rows
+        self.max_threads = max_threads
+        self.directory = directory
+        self._workspaces: "OrderedDict[str, _ThreadWorkspace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, thread_id: str, create: bool) -> Optional[_ThreadWorkspace]:
+        with self._lock:
+            workspace = self._workspaces.get(thread_id)
+            if workspace is None:
+                if not create:
+                    return None
+                if self.directory:
+                    Path(self.directory).mkdir(parents=True, exist_ok=True)
+                    path = str(Path(self.directory) / f"{thread_id}.sqlite")
+                else:
+                    path = ":memory:"
+                workspace = _ThreadWorkspace(sqlite3.connect(path, check_same_thread=False))
+                self._workspaces[thread_id] = workspace
+            self._workspaces.move_to_end(thread_id)
+            while len(self._workspaces) > self.max_threads:
+                evicted_thread_id, evicted = self._workspaces.popitem(last=False)
+                evicted.conn.close()
+                if self.directory:
+                    Path(self.directory, f"{evicted_thread_id}.sqlite").unlink(missing_ok=True)
+            return workspace
+
+    def save(self, thread_id: str, source_sql: str, rows: List[Dict[str, Any]]) -> Optional[str]:
+        """Stores `rows` as a new table of the thread's workspace, returns its name or None if not stored."""
+        if not rows or len(rows) > self.max_rows:
+            return None
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        workspace = self._get(thread_id, create=True)
+        with workspace.lock:
+            workspace.counter += 1
+            name = f"result_{workspace.counter}"
+            column_list = ", ".join(_quote(c) for c in columns)
+            workspace.conn.execute(f"DROP TABLE IF EXISTS {name}")  # leftover of a previous process
+            workspace.conn.execute(f"CREATE TABLE {name} ({column_list})")
+            workspace.conn.executemany(
+                f"INSERT INTO {name} VALUES ({', '.join('?' * len(columns))})",
+                [[_to_sqlite(row.get(c)) for c in columns] for row in rows],
+            )
+            workspace.conn.commit()
+            workspace.tables[name] = {"source_sql": source_sql, "columns": columns, "row_count": len(rows)}
+            while len(workspace.tables) > self.max_results:
+                old_name, _ = workspace.tables.popitem(last=False)
+                workspace.conn.execute(f"DROP TABLE IF EXISTS {old_name}")
+            workspace.conn.commit()
+        return name
+
+    def describe(self, thread_id: str) -> str:
+        """Prompt-friendly list of the thread's result tables, newest last."""
+        workspace = self._get(thread_id, create=False)
+        if workspace is None or not workspace.tables:
+            return "none"
+        with workspace.lock:
+            return "\n".join(
+                f"- {name} ({info['row_count']} rows; columns: {', '.join(info['columns'])}) "
+                f"from query: {info['source_sql']}"
+                for name, info in workspace.tables.items()
+            )
+
+    def query(self, thread_id: str, sql: str) -> List[Dict[str, Any]]:
+        """Runs a read-only SQLite query over the thread's workspace."""
+        workspace = self._get(thread_id, create=False)
+        if workspace is None or not workspace.tables:
+            raise LookupError("There are no previous results in this conversation.")
+        with workspace.lock:
+            workspace.conn.execute("PRAGMA query_only = ON")
+            try:
+                cursor = workspace.conn.execute(sql)
+                columns = [d[0] for d in cursor.description or ()]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                workspace.conn.execute("PRAGMA query_only = OFF")
+
+
+def _quote(identifier: str) -> str:
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _to_sqlite(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+result_workspace = ResultWorkspace(
+    max_results=config.result_workspace_max_results,
+    max_rows=config.result_workspace_max_rows,
+    max_threads=config.result_workspace_max_threads,
+    directory=config.resolve_path(config.result_workspace_dir) if config.result_workspace_dir else None,
+)
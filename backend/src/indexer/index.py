@@ -1,11 +1,23 @@
-from typing import List, Dict, Any
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
 
-from sqlalchemy import create_engine, MetaData
+from langchain_core.messages import HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from sqlalchemy import MetaData
+from src.core.admission import AdmissionRejected, db_limiter
+from src.core.config import config
+from src.core.db import get_engine
 from src.core.llms import get_llm
 from src.core.models import DatabaseCredentials
-from src.core.vector_store import add_documents
+from src.core.vector_store import add_documents, schema_collection_name
+from src.indexer.profiler import profile_tables
+from src.indexer.schema_format import build_schema_catalog, format_schema, table_documents, verbose_column
 
-# Define a constant for the collection name for schema details
+logger = logging.getLogger(__name__)
+
+# Prefix of the schema collections, each schema gets its own collection named by its fingerprint
 SCHEMA_COLLECTION_NAME = "database_schema_details"
 
 
@@ -25,32 +37,62 @@ def construct_db_uri(credentials: DatabaseCredentials) -> str:
     return f"{dialect_part}://{credentials.username}:{credentials.password}@{credentials.host}:{credentials.port}/{credentials.database}"
 
 
-def _create_schema_documents(metadata: MetaData, thread_id) -> (List[str], List[Dict[str, Any]], List[str]):
+def construct_test_db_uri() -> str:
+    """
+    Connection string of the configured test database. SQLite (a file path in `TEST_DB_NAME`, for local
+    development and load tests) is only accepted here, clients can't open files on the server.
+    """
+    if config.test_db_engine == "sqlite":
+        return f"sqlite:///{config.test_db_name}"
+    return construct_db_uri(DatabaseCredentials(
+        engine=config.test_db_engine,
+        host=config.test_db_host,
+        port=config.test_db_port,
+        username=config.test_db_username,
+        password=config.test_db_password,
+        database=config.test_db_name,
+    ))
+
+
+def _create_schema_documents(metadata: MetaData) -> (List[str], List[Dict[str, Any]], List[str]):
     """Creates structured documents from the database schema for vector store indexing."""
     docs, metadatas, ids = [], [], []
 
+    for table_name, doc_content in table_documents(metadata).items():
+        docs.append(doc_content)
+        metadatas.append({"document": "table", "table_name": table_name, "table_key": table_name.lower()})
+        ids.append(f"table_{table_name}")
+
+    return docs, metadatas, ids
+
+
+def _create_column_documents(metadata: MetaData) -> (List[str], List[Dict[str, Any]], List[str]):
+    """
+    One document per column, so a relevant column of a wide table isn't drowned out by the others.
+    `column_line` is the column as it appears in the table document.
+    """
+    docs, metadatas, ids = [], [], []
+
     for table_name, table in metadata.tables.items():
-        doc_content = f"Table name: {table_name}\n"
-        doc_content += "Columns:\n"
         for column in table.columns:
-            col_info = f"- {column.name} (type: {column.type})"
-            if column.primary_key:
-                col_info += " [PRIMARY KEY]"
-            if column.foreign_keys:
-                fk = next(iter(column.foreign_keys))
-                col_info += f" (references {fk.column.table.name}.{fk.column.name})"
-            doc_content += col_info + "\n"
-
-        docs.append(doc_content)
-        metadatas.append({"table_name": table_name})
-        ids.append(f"table_{thread_id}_{table_name}")
+            column_line = verbose_column(column)
+            docs.append(f"{table_name}.{column.name} {column_line[2:]}"
+                        + (f" - {column.comment}" if column.comment else ""))
+            metadatas.append({
+                "document": "column",
+                "table_name": table_name,
+                "table_key": table_name.lower(),
+                "column_line": column_line,
+                "is_key": bool(column.primary_key or column.foreign_keys),
+            })
+            ids.append(f"column_{table_name}.{column.name}")
 
     return docs, metadatas, ids
 
 
 def _summarize_schema_with_llm(schema_string: str) -> str:
     """Uses an LLM to generate a high-level summary of the database schema."""
-    llm = get_llm()
+    llm = get_llm(cache=True)
 
     prompt = f"""
     Based on the following database schema, please provide a concise, high-level summary.
@@ -69,34 +111,177 @@ def _summarize_schema_with_llm(schema_string: str) -> str:
     return response.content
 
 
-def index_database(database_uri: str, thread_id: str) -> (str, str):
+def _group_tables(metadata: MetaData, docs_by_table: Dict[str, str], max_chars: int) -> List[List[str]]:
+    """
+    Splits tables into chunks of at most `max_chars` of schema text.
+    Tables connected by foreign keys are kept together, tables without relations are grouped by schema.
+    """
+    parent = {name: name for name in metadata.tables}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for table_name, table in metadata.tables.items():
+        for fk in table.foreign_keys:
+            referred = fk.column.table.fullname
+            if referred in parent:
+                parent[find(table_name)] = find(referred)
+
+    roots = {name: find(name) for name in parent}
+    cluster_sizes = Counter(roots.values())
+    clusters: Dict[str, List[str]] = {}
+    for table_name, table in metadata.tables.items():
+        root = roots[table_name]
+        key = f"fk:{root}" if cluster_sizes[root] > 1 else f"schema:{table.schema or ''}"
+        clusters.setdefault(key, []).append(table_name)
+
+    chunks, current, current_size = [], [], 0
+    for cluster in sorted(clusters.values(), key=len, reverse=True):
+        for table_name in cluster:
+            size = len(docs_by_table[table_name])
+            if current and current_size + size > max_chars:
+                chunks.append(current)
+                current, current_size = [], 0
+            current.append(table_name)
+            current_size += size
+        # start a new chunk per big cluster, small ones are packed together.
+        if current_size > max_chars // 2:
+            chunks.append(current)
+            current, current_size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _summarize_schema_part(part: str, index: int, total: int) -> str:
+    llm = get_llm(cache=True)
+    prompt = f"""
+    The following is part {index} of {total} of a database schema.
+    Summarize it in a few sentences: the main entities, what they represent and how they relate.
+    Mention table names, but do not describe every single column.
+
+    Schema part:
+    ---
+    {part}
+    ---
+    Summary:
+    """
+    return llm.invoke(prompt).content
+
+
+def _summarize_large_schema(metadata: MetaData, docs_by_table: Dict[str, str]) -> str:
+    """
+    Map-reduce summary for schemas that don't fit in one prompt: chunks of related tables are
+    summarized concurrently, then the partial summaries are merged in a single reduce call.
+    """
+    chunks = _group_tables(metadata, docs_by_table, config.schema_summary_chunk_chars)
+    if len(chunks) == 1:
+        return _summarize_schema_with_llm("\n\n".join(docs_by_table.values()))
+
+    parts = ["\n\n".join(docs_by_table[name] for name in chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=config.schema_summary_concurrency) as executor:
+        partial_summaries = list(executor.map(
+            _summarize_schema_part, parts, range(1, len(parts) + 1), [len(parts)] * len(parts)
+        ))
+
+    llm = get_llm(cache=True)
+    joined = "\n\n".join(f"Part {i}: {summary}" for i, summary in enumerate(partial_summaries, start=1))
+    prompt = f"""
+    Below are summaries of the parts of one database schema.
+    Merge them into a concise, high-level summary of the whole database.
+    Focus on the main entities and their relationships, including relationships across parts.
+    The summary should be a single paragraph that can be used as context for another AI.
+    After summary, provide example questions for Business Intelligence purposes.
+
+    Part summaries:
+    ---
+    {joined}
+    ---
+    Summary:
+    """
+    return llm.invoke(prompt).content
+
+
+def _approximate_tokens(text: str) -> int:
+    return count_tokens_approximately([HumanMessage(content=text)])
+
+
+def index_database(database_uri: str, thread_id: str,
+                   progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                   schema_format: Optional[str] = None,
+                   ) -> (str, str, Dict[str, Dict[str, str]]):
     """
     Connects to a database, indexes its schema into a vector store,
-    and returns a high-level summary for the agent's context.
+    and returns a high-level summary, the schema context and the schema catalog for the agent.
+    On failure, the schema context is an "Error: ..." message.
+    The schema context is serialized in `schema_format` (`config.schema_format` by default).
+
+    `progress(stage, info)` is called when a stage starts: "reflect", "profile", "index", "schema_ready"
+    (info has `schema_context` and `schema_catalog`, the agent can be used from here on) and "summarize".
     """
+    progress = progress or (lambda stage, info: None)
+    progress("reflect", {})
     try:
-        engine = create_engine(database_uri)
+        engine = get_engine(database_uri)
         metadata = MetaData()
-        metadata.reflect(bind=engine)
+        with db_limiter(database_uri).acquire(thread_id):
+            metadata.reflect(bind=engine)
+    except AdmissionRejected:
+        raise
     except Exception as e:
-        return f"Error: Could not reflect database schema. Details: {e}"
+        return "", f"Error: Could not reflect database schema. Details: {e}", {}
 
     if not metadata.tables:
-        return "No tables found in the database."
+        return "", "Error: No tables found in the database.", {}
 
     # 1. Create documents for the vector store
-    docs, metadatas, ids = _create_schema_documents(metadata, thread_id)
+    docs, metadatas, ids = _create_schema_documents(metadata)
 
-    # 2. Add documents to the vector store, scoped by thread_id
+    # 1.1. Optionally profile column values, profiles are stored next to the table documents
+    fingerprint_parts = list(docs)
+    if config.schema_profiling_enabled:
+        progress("profile", {"tables": len(metadata.tables)})
+        with db_limiter(database_uri).acquire(thread_id):
+            profiles = profile_tables(
+                engine, metadata,
+                sample_rows=config.schema_profile_sample_rows,
+                max_distinct=config.schema_profile_max_distinct,
+                max_tables=config.schema_profile_max_tables,
+            )
+        for meta in metadatas:
+            meta["value_profile"] = profiles.get(meta["table_name"], "")
+        fingerprint_parts += profiles.values()  # same schema with different data -> different collection
+
+    # 2. Add documents to the schema's own collection and register it for the thread,
+    # column documents carry the column comments, which the table documents don't
+    column_docs, column_metadatas, column_ids = [], [], []
+    if config.schema_column_documents:
+        column_docs, column_metadatas, column_ids = _create_column_documents(metadata)
+        fingerprint_parts += column_docs
+    progress("index", {"documents": len(docs) + len(column_docs)})
     add_documents(
-        collection_name=SCHEMA_COLLECTION_NAME,
-        documents=docs,
-        metadatas=metadatas,
-        ids=ids,
+        collection_name=schema_collection_name(SCHEMA_COLLECTION_NAME, fingerprint_parts),
+        documents=docs + column_docs,
+        metadatas=metadatas + column_metadatas,
+        ids=ids + column_ids,
         thread_id=thread_id
     )
 
-    # 3. Generate a high-level summary for the LLM context
     schema_string_for_summary = "\n\n".join(docs)
-    summary = _summarize_schema_with_llm(schema_string_for_summary)
-    return summary, schema_string_for_summary
+    schema_format = schema_format or config.schema_format
+    schema_context = format_schema(metadata, schema_format, config.schema_compact_omit_columns)
+    if schema_format != "verbose":
+        logger.info("Schema context of %s in %s format: %d tokens instead of %d", thread_id, schema_format,
+                    _approximate_tokens(schema_context), _approximate_tokens(schema_string_for_summary))
+    schema_catalog = build_schema_catalog(metadata)
+    progress("schema_ready", {"schema_context": schema_context, "schema_catalog": schema_catalog})
+
+    # 3. Generate a high-level summary for the LLM context
+    progress("summarize", {})
+    summary = _summarize_large_schema(
+        metadata, {meta["table_name"]: doc for meta, doc in zip(metadatas, docs)}
+    )
+    return summary, schema_context, schema_catalog
@@ -0,0 +1,142 @@
+"""
+Background indexing jobs for the asynchronous conversation init.
+
+A job runs `index_database` in a thread pool and records per-stage progress, so clients can
+poll (or stream) the status while the conversation becomes usable at the `schema_ready` stage,
+before the summary is done. Jobs are stored in SQLite under `config.data_dir`, so every worker
+sees the job of every other one.
+"""
+import json
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, Literal, Optional
+
+from src.core.config import config
+from src.core.db import connect_sqlite
+from src.indexer.index import index_database
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=config.indexing_jobs_concurrency, thread_name_prefix="indexing")
+_store = None
+_store_lock = threading.Lock()
+_FINISHED_JOB_TTL_SECONDS = 60 * 60
+
+
+@dataclass
+class IndexingJob:
+    thread_id: str
+    status: Literal["pending", "running", "schema_ready", "done", "failed"] = "pending"
+    stage: Optional[str] = None
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # stage -> started_at, finished_at, info
+    summary: Optional[str] = None
+    summary_error: Optional[str] = None  # the summary failed after `schema_ready`, the conversation is usable
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    version: int = 0  # bumped on every change, lets streams send only updates
+
+    @property
+    def schema_ready(self) -> bool:
+        return self.status in ("schema_ready", "done")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def _save(self):
+        with _store_lock:
+            conn = _get_store()
+            conn.execute("INSERT OR REPLACE INTO indexing_jobs (thread_id, job, finished_at) VALUES (?, ?, ?)",
+                         (self.thread_id, json.dumps(self.to_dict()), self.finished_at))
+            conn.commit()
+
+    def _enter_stage(self, stage: str, info: Dict[str, Any]):
+        now = time.time()
+        if self.stage is not None:
+            self.stages[self.stage]["finished_at"] = now
+        self.stage = stage
+        self.stages[stage] = {"started_at": now, "finished_at": None, **info}
+        self.version += 1
+        self._save()
+
+    def _finish(self, status: str, summary: Optional[str] = None, error: Optional[str] = None,
+                summary_error: Optional[str] = None):
+        self.finished_at = time.time()
+        if self.stage is not None:
+            self.stages[self.stage]["finished_at"] = self.finished_at
+        self.status, self.summary, self.error, self.summary_error = status, summary, error, summary_error
+        self.version += 1
+        self._save()
+
+    def _set_status(self, status: str):
+        self.status = status
+        self.version += 1
+        self._save()
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        conn = connect_sqlite(config.resolve_path(config.indexing_jobs_path))
+        conn.execute("CREATE TABLE IF NOT EXISTS indexing_jobs ("
+                     "thread_id TEXT PRIMARY KEY, job TEXT NOT NULL, finished_at REAL)")
+        conn.commit()
+        _store = conn
+    return _store
+
+
+def get_indexing_job(thread_id: str) -> Optional[IndexingJob]:
+    """The latest state of the job of a thread, started by any worker, None for synchronous or expired inits."""
+    with _store_lock:
+        row = _get_store().execute("SELECT job FROM indexing_jobs WHERE thread_id = ?", (thread_id,)).fetchone()
+    return None if row is None else IndexingJob(**json.loads(row[0]))
+
+
+def _forget_finished_jobs():
+    with _store_lock:
+        conn = _get_store()
+        conn.execute("DELETE FROM indexing_jobs WHERE finished_at < ?", (time.time() - _FINISHED_JOB_TTL_SECONDS,))
+        conn.commit()
+
+
+def start_indexing_job(thread_id: str, database_uri: str,
+                       on_schema_ready: Callable[[str, Dict[str, Dict[str, str]]], None],
+                       schema_format: Optional[str] = None) -> IndexingJob:
+    """
+    Runs `index_database` in the background.
+    `on_schema_ready(schema_context, schema_catalog)` is called from the job once the schema context exists.
+    """
+    _forget_finished_jobs()
+    job = IndexingJob(thread_id=thread_id)
+    job._save()
+
+    def progress(stage: str, info: Dict[str, Any]):
+        if stage == "schema_ready":
+            on_schema_ready(info["schema_context"], info["schema_catalog"])
+            job._set_status("schema_ready")
+            return
+        job._enter_stage(stage, info)
+
+    def run():
+        job._set_status("running")
+        try:
+            summary, structure, _ = index_database(database_uri, thread_id, progress=progress,
+                                                  schema_format=schema_format)
+        except Exception as e:
+            logger.error("Indexing job %s failed: %s", thread_id, traceback.format_exc())
+            if job.schema_ready:  # the schema is saved, only the summary is missing
+                job._finish("done", summary_error=f"Error: {e}")
+            else:
+                job._finish("failed", error=f"Error: {e}")
+            return
+        if structure.startswith("Error:"):
+            job._finish("failed", error=structure)
+        else:
+            job._finish("done", summary=summary)
+
+    _executor.submit(run)
+    return job
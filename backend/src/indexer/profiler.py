@@ -0,0 +1,73 @@
+"""
+Column value profiling for the schema index.
+
+Gives the DBA agent real literals to work with ('United States' vs 'USA', status codes, enum casing)
+and value ranges. Every query only looks at the first `sample_rows` rows of a table, so profiling
+stays bounded on big tables; ranges are therefore sample ranges, not exact ones.
+"""
+import logging
+from typing import Dict
+
+from sqlalchemy import Engine, MetaData, Table, select, func
+from sqlalchemy import types as sqltypes
+
+logger = logging.getLogger(__name__)
+
+_TEXT_TYPES = (sqltypes.String, sqltypes.Enum)
+_RANGE_TYPES = (sqltypes.Numeric, sqltypes.Integer, sqltypes.Float, sqltypes.Date, sqltypes.DateTime)
+_MAX_VALUE_LENGTH = 60
+
+
+def _profile_table(conn, table: Table, sample_rows: int, max_distinct: int) -> str:
+    sample = select(table).limit(sample_rows).subquery()
+    lines = []
+
+    range_columns = [c for c in table.columns if isinstance(c.type, _RANGE_TYPES)]
+    if range_columns:
+        aggregates = []
+        for column in range_columns:
+            aggregates += [func.min(sample.c[column.name]), func.max(sample.c[column.name])]
+        row = conn.execute(select(*aggregates)).one()
+        for i, column in enumerate(range_columns):
+            low, high = row[2 * i], row[2 * i + 1]
+            if low is not None:
+                lines.append(f"- {column.name}: min {low}, max {high}")
+
+    for column in table.columns:
+        if not isinstance(column.type, _TEXT_TYPES):
+            continue
+        sample_column = sample.c[column.name]
+        values = conn.execute(
+            select(sample_column).where(sample_column.is_not(None)).distinct().limit(max_distinct + 1)
+        ).scalars().all()
+        if not values or len(values) > max_distinct:  # empty or not low-cardinality
+            continue
+        if any(len(str(v)) > _MAX_VALUE_LENGTH for v in values):  # free text, not categories
+            continue
+        lines.append(f"- {column.name}: one of " + ", ".join(repr(str(v)) for v in sorted(values, key=str)))
+
+    if not lines:
+        return ""
+    return f"Value profile of {table.name} (sampled):\n" + "\n".join(lines)
+
+
+def profile_tables(engine: Engine, metadata: MetaData, sample_rows: int, max_distinct: int,
+                   max_tables: int) -> Dict[str, str]:
+    """
+    Samples distinct values of low-cardinality text columns and min/max of numeric and date columns.
+
+    Returns:
+        Dict[str, str]: table name -> profile text, tables without anything to profile are omitted.
+    """
+    profiles = {}
+    with engine.connect() as conn:
+        for table_name, table in list(metadata.tables.items())[:max_tables]:
+            try:
+                profile = _profile_table(conn, table, sample_rows, max_distinct)
+            except Exception as e:  # permissions, exotic types etc. profiling is best effort.
+                logger.warning("Failed to profile table %s: %s", table_name, e)
+                conn.rollback()
+                continue
+            if profile:
+                profiles[table_name] = profile
+    return profiles
@@ -0,0 +1,113 @@
+"""
+Serializations of the reflected schema for prompts.
+
+"verbose" is the table documents of the vector store, one line per column. "compact" is a DDL-like line
+per table with abbreviated types, e.g. `orders(id int PK, customer_id int FK>customers.id, amount dec(10,2))`,
+and leaves out boilerplate columns (audit timestamps, ETL bookkeeping) matched by `omit_patterns`.
+Primary and foreign keys are never left out.
+"""
+import re
+from typing import Dict, Sequence
+
+from sqlalchemy import Column, MetaData, Table
+from src.core.constants import DEFAULT_OMIT_PATTERNS
+
+SCHEMA_FORMATS = ("verbose", "compact")
+
+COMPACT_LEGEND = ("Tables as name(column type, ...). PK - primary key, FK>table.column - foreign key, "
+                  "... - boilerplate columns left out.")
+
+# (pattern of the type, abbreviation), the first match wins; parameters like (10,2) are kept.
+_TYPE_ABBREVIATIONS = [
+    (r"^(character varying|varchar|nvarchar|varchar2|nvarchar2|string)\b", "str"),
+    (r"^(character|char|nchar)\b", "char"),
+    (r"^(text|clob|nclob|mediumtext|longtext|tinytext)\b", "text"),
+    (r"^(bigint|int8|int64)\b", "bigint"),
+    (r"^(smallint|int2|tinyint|int16|int32|int4|integer|int)\b", "int"),
+    (r"^(numeric|decimal|number)\b", "dec"),
+    (r"^(double precision|double|float8|float64|float4|float32|float|real)\b", "float"),
+    (r"^(boolean|bool)\b", "bool"),
+    (r"^(timestamp with time zone|timestamptz)\b", "tstz"),
+    (r"^(timestamp without time zone|timestamp|datetime64|datetime)\b", "ts"),
+    (r"^(date)\b", "date"),
+    (r"^(time)\b", "time"),
+    (r"^(uuid)\b", "uuid"),
+    (r"^(jsonb|json)\b", "json"),
+    (r"^(bytea|blob|binary|varbinary|longblob)\b", "bytes"),
+]
+_TYPE_PATTERNS = [(re.compile(pattern, re.IGNORECASE), short) for pattern, short in _TYPE_ABBREVIATIONS]
+
+
+def abbreviate_type(type_name: str) -> str:
+    type_name = type_name.strip()
+    for pattern, short in _TYPE_PATTERNS:
+        match = pattern.match(type_name)
+        if match:
+            parameters = type_name[match.end():].replace(" ", "")
+            if short in ("str", "char", "text") and parameters.startswith("("):
+                return short  # lengths don't help to write queries
+            return short + parameters
+    return type_name.lower().replace(" ", "")
+
+
+def verbose_column(column: Column) -> str:
+    col_info = f"- {column.name} (type: {column.type})"
+    if column.primary_key:
+        col_info += " [PRIMARY KEY]"
+    if column.foreign_keys:
+        fk = next(iter(column.foreign_keys))
+        col_info += f" (references {fk.column.table.name}.{fk.column.name})"
+    return col_info
+
+
+def _verbose_table(table_name: str, table: Table) -> str:
+    doc_content = f"Table name: {table_name}\n"
+    doc_content += "Columns:\n"
+    for column in table.columns:
+        doc_content += verbose_column(column) + "\n"
+    return doc_content
+
+
+def _compact_table(table_name: str, table: Table, omit: Sequence[re.Pattern]) -> str:
+    columns = []
+    omitted = False
+    for column in table.columns:
+        if not column.primary_key and not column.foreign_keys and any(p.fullmatch(column.name) for p in omit):
+            omitted = True
+            continue
+        col_info = f"{column.name} {abbreviate_type(str(column.type))}"
+        if column.primary_key:
+            col_info += " PK"
+        if column.foreign_keys:
+            fk = next(iter(column.foreign_keys))
+            col_info += f" FK>{fk.column.table.name}.{fk.column.name}"
+        columns.append(col_info)
+    if omitted:
+        columns.append("...")
+    return f"{table_name}({', '.join(columns)})"
+
+
+def table_documents(metadata: MetaData) -> Dict[str, str]:
+    """Table name -> verbose document, the documents of the vector store."""
+    return {table_name: _verbose_table(table_name, table) for table_name, table in metadata.tables.items()}
+
+
+def build_schema_catalog(metadata: MetaData) -> Dict[str, Dict[str, str]]:
+    """Table name -> column name -> type, used for static analysis of generated SQL."""
+    return {
+        table_name: {column.name: str(column.type) for column in table.columns}
+        for table_name, table in metadata.tables.items()
+    }
+
+
+def format_schema(metadata: MetaData, schema_format: str,
+                  omit_patterns: Sequence[str] = DEFAULT_OMIT_PATTERNS) -> str:
+    """The schema context for prompts in `schema_format`, one of `SCHEMA_FORMATS`."""
+    if schema_format == "verbose":
+        return "\n\n".join(table_documents(metadata).values())
+    if schema_format == "compact":
+        omit = [re.compile(p, re.IGNORECASE) for p in omit_patterns]
+        return "\n".join([COMPACT_LEGEND] + [
+            _compact_table(table_name, table, omit) for table_name, table in metadata.tables.items()
+        ])
+    raise ValueError(f"Unknown schema format: {schema_format}")
@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+# must be set before anything imports src.core.config
+for key, value in {
+    "ENV": "dev",
+    "PORT": "8000",
+    "OPENAI_API_KEY": "stub",
+    "CEREBRAS_API_KEY": "stub",
+    "JINA_API_KEY": "stub",
+    "TEST_DB_ENGINE": "sqlite",
+    "TEST_DB_HOST": "localhost",
+    "TEST_DB_PORT": "0",
+    "TEST_DB_USERNAME": "stub",
+    "TEST_DB_PASSWORD": "stub",
+    "TEST_DB_NAME": "stub",
+    "LANGFUSE_HOST": "http://127.0.0.1:9",
+    "LANGFUSE_PUBLIC_KEY": "stub",
+    "LANGFUSE_SECRET_KEY": "stub",
+    "LANGFUSE_BATCH_SIZE": "100",
+    "DATA_DIR": tempfile.mkdtemp(prefix="backend-tests-"),
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+from contextlib import ExitStack
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src.api import routes
+from src.core import llms
+from src.core.admission import db_limiter
+from src.core.utils import generate_uuid
+
+SQL = "SELECT country, COUNT(*) AS customers FROM customers GROUP BY country"
+
+
+class _Analyst(BaseChatModel):
+    """Delegates every question to the DBA, which answers with fixed SQL."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "test"
+
+    def _respond(self, messages, **kwargs) -> AIMessage:
+        if kwargs.get("response_format"):
+            message = AIMessage(content=json.dumps({"sql_query": SQL}))
+        elif kwargs.get("tools") and isinstance(messages[-1], HumanMessage):
+            message = AIMessage(content="", tool_calls=[{
+                "name": "delegate_to_database_administrator",
+                "args": {"sql_query_requirements": "Count customers per country"},
+                "id": "call_1",
+            }])
+        else:
+            message = AIMessage(content="Customers per country.")
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, **kwargs))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._respond(messages, **kwargs)
+        yield ChatGenerationChunk(message=AIMessageChunk(content=message.content, tool_call_chunks=[
+            {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+            for i, tc in enumerate(message.tool_calls)
+        ]))
+
+
+@pytest.fixture
+def conversation(monkeypatch, tmp_path):
+    for model_key in llms.models:
+        monkeypatch.setitem(llms.models, model_key, _Analyst())
+    monkeypatch.setattr(llms, "_built_models", {})
+    database_uri = f"sqlite:///{tmp_path / 'shop.sqlite'}"
+    with sqlite3.connect(tmp_path / "shop.sqlite") as conn:
+        conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, country TEXT)")
+    thread_id = generate_uuid()
+    routes._save_conversation_state(thread_id, database_uri, "sqlite", "Table name: customers\nColumns: id, country",
+                                     {"customers": {"id": "INTEGER", "country": "TEXT"}})
+    return thread_id, database_uri
+
+
+def _saturated(database_uri: str, monkeypatch) -> ExitStack:
+    limiter = db_limiter(database_uri)
+    monkeypatch.setattr(limiter, "queue_timeout", 0.05)
+    slots = ExitStack()
+    for _ in range(limiter.max_concurrency):
+        slots.enter_context(limiter.acquire("another-thread"))
+    return slots
+
+
+def test_saturated_limiter_during_a_tool_call_returns_503(conversation, monkeypatch, caplog):
+    thread_id, database_uri = conversation
+    from main import app
+    client = TestClient(app)
+    question = {"role": "user", "content": "Break that down by country"}  # a follow-up, the analyst calls tools
+
+    with _saturated(database_uri, monkeypatch):
+        response = client.post(f"/v1/conversation/{thread_id}", params={"use_cache": False}, json=question)
+        assert response.status_code == 503
+
+        streamed = client.post(f"/v1/conversation/{thread_id}", params={"use_cache": False, "stream": True},
+                               json=question)
+        events = [json.loads(line) for line in streamed.text.splitlines() if line]
+        assert events[-1]["event"] == "error" and events[-1]["status"] == 503
+    rejections = [r.getMessage() for r in caplog.records if r.name == "src.api.routes"]
+    assert len(rejections) == 2 and all(f"limiter {db_limiter(database_uri).name}" in r for r in rejections)
+
+    response = client.post(f"/v1/conversation/{thread_id}", params={"use_cache": False}, json=question)
+    assert response.status_code == 200
+    assert response.json()["data"][0]["sql_query"] == SQL
@@ -0,0 +1,21 @@
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from src.core.config import config
+from src.core.models import DatabaseCredentials
+from src.indexer.index import construct_test_db_uri
+
+
+def test_clients_cant_open_sqlite_files():
+    with pytest.raises(ValidationError):
+        DatabaseCredentials(engine="sqlite", database="checkpoints.sqlite")
+
+    from main import app
+    response = TestClient(app).post("/v1/conversation/init", json={"engine": "sqlite", "database": "checkpoints.sqlite"})
+    assert response.status_code == 422
+
+
+def test_sqlite_test_database(monkeypatch):
+    monkeypatch.setattr(config, "test_db_engine", "sqlite")
+    monkeypatch.setattr(config, "test_db_name", "/tmp/test_db.sqlite")
+    assert construct_test_db_uri() == "sqlite:////tmp/test_db.sqlite"
@@ -0,0 +1,52 @@
+import time
+
+from fastapi.testclient import TestClient
+from src.api import routes
+from src.core.utils import generate_uuid
+from src.indexer import jobs
+
+SCHEMA = "Table name: customers\nColumns: id, country"
+
+
+def _finished_job(thread_id: str) -> jobs.IndexingJob:
+    deadline = time.monotonic() + 5
+    while (job := jobs.get_indexing_job(thread_id)).finished_at is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return job
+
+
+def test_failed_summary_keeps_the_conversation_usable(monkeypatch):
+    def index_database(database_uri, thread_id, progress, schema_format=None):
+        progress("reflect", {})
+        progress("schema_ready", {"schema_context": SCHEMA, "schema_catalog": {"customers": {"id": "INTEGER"}}})
+        progress("summarize", {})
+        raise TimeoutError("summary model timed out")
+
+    monkeypatch.setattr(jobs, "index_database", index_database)
+    thread_id = generate_uuid()
+    jobs.start_indexing_job(thread_id, "sqlite://", on_schema_ready=lambda schema_context, schema_catalog:
+                            routes._save_conversation_state(thread_id, "sqlite://", "sqlite",
+                                                            schema_context, schema_catalog))
+
+    job = _finished_job(thread_id)
+    assert job.status == "done" and job.schema_ready
+    assert job.summary is None and "timed out" in job.summary_error
+    routes._ensure_schema_ready(thread_id)  # chat goes through
+
+    from main import app
+    status = TestClient(app).get(f"/v1/conversation/{thread_id}/status").json()
+    assert status["status"] == "done" and status["summary_error"]
+
+
+def test_failure_before_the_schema_is_saved_fails_the_job(monkeypatch):
+    def index_database(database_uri, thread_id, progress, schema_format=None):
+        progress("reflect", {})
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(jobs, "index_database", index_database)
+    thread_id = generate_uuid()
+    jobs.start_indexing_job(thread_id, "sqlite://", on_schema_ready=lambda *args: None)
+
+    job = _finished_job(thread_id)
+    assert job.status == "failed" and not job.schema_ready
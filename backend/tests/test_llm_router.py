@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from itertools import count
+from typing import List, Optional
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+from src.core import llm_router
+from src.core.admission import FairLimiter
+from src.core.llm_router import HedgedChatModel, LatencyTracker, LimitedChatModel
+
+QUESTION = [HumanMessage(content="How many customers are there?")]
+_names = count()
+
+
+class _Stub(BaseChatModel):
+    """Answers `text` after `delay` seconds (the first chunk when streaming), or raises `error`."""
+    text: str
+    delay: float = 0.0
+    error: Optional[str] = None
+    calls: List[float] = Field(default_factory=list)  # when each call started
+    closed: threading.Event = Field(default_factory=threading.Event)  # a stream was abandoned
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self) -> AIMessage:
+        self.calls.append(time.monotonic())
+        time.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return AIMessage(content=self.text)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self._respond())])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._respond()
+        try:
+            for token in message.content.split(" "):
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+                time.sleep(0.01)
+        except GeneratorExit:
+            self.closed.set()
+            raise
+
+
+class _AsyncStub(_Stub):
+    """Natively async, reports its admission the way `LimitedChatModel` does once it has a slot."""
+    cancelled: threading.Event = Field(default_factory=threading.Event)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(time.monotonic())
+        llm_router._on_admitted.get()()
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+        if self.error:
+            raise RuntimeError(self.error)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.text))])
+
+
+def _limited(stub: _Stub, max_concurrency: int = 1) -> LimitedChatModel:
+    return LimitedChatModel(llm=stub, limiter=FairLimiter(f"llm:test-{next(_names)}", max_concurrency, 5, 5))
+
+
+def _hedged(primary, secondary, hedge_delay: float = 0.1) -> HedgedChatModel:
+    return HedgedChatModel(primary=primary, primary_key="primary", secondary=secondary, secondary_key="secondary",
+                           default_hedge_delay=hedge_delay, tracker=LatencyTracker())
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = _Stub(text="primary", delay=0.02), _Stub(text="secondary")
+    assert _hedged(_limited(primary), _limited(secondary)).invoke(QUESTION).content == "primary"
+    assert secondary.calls == []
+
+
+def test_hedge_fires_after_the_delay_and_the_faster_answer_wins():
+    primary, secondary = _Stub(text="primary", delay=0.5), _Stub(text="secondary")
+    started = time.monotonic()
+    assert _hedged(_limited(primary), _limited(secondary)).invoke(QUESTION).content == "secondary"
+    assert secondary.calls[0] - primary.calls[0] >= 0.09
+    assert time.monotonic() - started < 0.4  # didn't wait for the slow primary
+
+
+def test_hedge_delay_starts_once_the_primary_has_a_slot():
+    primary, secondary = _Stub(text="primary", delay=0.02), _Stub(text="secondary")
+    limited = _limited(primary)
+    held = threading.Event()
+
+    def hold_the_slot():
+        with limited.limiter.acquire("another-thread"):
+            held.set()
+            time.sleep(0.3)
+
+    threading.Thread(target=hold_the_slot).start()
+    held.wait()
+    model = _hedged(limited, _limited(secondary))
+    assert model.invoke(QUESTION).content == "primary"
+    assert secondary.calls == []  # the time in the queue doesn't count
+    assert model.tracker._samples["primary"][0] < 0.2
+
+
+def test_busy_secondary_is_not_hedged():
+    primary, secondary = _Stub(text="primary", delay=0.3), _Stub(text="secondary")
+    limited_secondary = _limited(secondary)
+    with limited_secondary.limiter.acquire("another-thread"):
+        assert _hedged(_limited(primary), limited_secondary).invoke(QUESTION).content == "primary"
+    assert secondary.calls == []
+    assert limited_secondary.limiter.snapshot()["rejected"] == 0
+
+
+def test_losing_stream_is_closed():
+    primary, secondary = _Stub(text="slow primary", delay=0.3), _Stub(text="fast secondary")
+    limited_primary = _limited(primary)
+    chunks = list(_hedged(limited_primary, _limited(secondary)).stream(QUESTION))
+    assert "".join(chunk.content for chunk in chunks).strip() == "fast secondary"
+    assert primary.closed.wait(2)
+    assert limited_primary.limiter.snapshot()["in_flight"] == 0  # its slot is released
+
+
+def test_losing_async_call_is_cancelled():
+    primary, secondary = _AsyncStub(text="primary", delay=1.0), _AsyncStub(text="secondary")
+    started = time.monotonic()
+    assert asyncio.run(_hedged(primary, secondary).ainvoke(QUESTION)).content == "secondary"
+    assert primary.cancelled.is_set()
+    assert time.monotonic() - started < 0.5
+
+
+def test_failed_primary_falls_back_to_the_secondary():
+    primary, secondary = _Stub(text="primary", error="primary is down"), _Stub(text="secondary")
+    assert _hedged(_limited(primary), _limited(secondary)).invoke(QUESTION).content == "secondary"
+
+
+@pytest.mark.parametrize("primary_delay", [0.0, 0.3])  # before and after the hedge
+def test_error_propagates_when_both_fail(primary_delay):
+    primary = _Stub(text="primary", delay=primary_delay, error="primary is down")
+    secondary = _Stub(text="secondary", error="secondary is down")
+    with pytest.raises(RuntimeError, match="is down"):
+        _hedged(_limited(primary), _limited(secondary)).invoke(QUESTION)
+    assert len(primary.calls) == len(secondary.calls) == 1
+
+
+def test_async_error_propagates_when_both_fail():
+    primary = _AsyncStub(text="primary", delay=0.3, error="primary is down")
+    secondary = _AsyncStub(text="secondary", error="secondary is down")
+    with pytest.raises(RuntimeError, match="secondary is down"):  # the first failure
+        asyncio.run(_hedged(primary, secondary).ainvoke(QUESTION))
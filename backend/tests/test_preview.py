@@ -0,0 +1,43 @@
+import sqlite3
+
+import sqlglot
+from src.core.preview import preview_sql
+
+
+def _orders_db() -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, country TEXT);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER, status TEXT);
+        INSERT INTO customers VALUES (1, 'Germany'), (2, 'France');
+        INSERT INTO orders VALUES (1, 1, 'paid'), (2, 2, 'paid'), (3, 1, 'refunded');
+    """)
+    return conn
+
+
+def test_schema_qualified_columns_resolve_against_the_sample():
+    sql = ("SELECT main.orders.status, COUNT(*) FROM main.orders "
+           "JOIN main.customers c ON c.id = main.orders.customer_id "
+           "GROUP BY main.orders.status ORDER BY main.orders.status")
+    preview = preview_sql(sql, "sqlite", sample_percent=1.0, max_scan_rows=1000)
+
+    assert preview.method == "bounded_scan"
+    conn = _orders_db()
+    assert conn.execute(preview.sql).fetchall() == conn.execute(sql).fetchall()
+
+
+def test_schema_qualified_columns_with_native_sampling():
+    sql = "SELECT public.orders.status, COUNT(*) FROM public.orders GROUP BY public.orders.status"
+    preview = preview_sql(sql, "postgres", sample_percent=1.0, max_scan_rows=1000)
+
+    assert preview.method == "tablesample"
+    assert "TABLESAMPLE SYSTEM (1.0)) AS orders" in preview.sql
+    columns = [column.sql() for column in sqlglot.parse_one(preview.sql, read="postgres").find_all(sqlglot.exp.Column)]
+    assert columns == ["orders.status", "orders.status"]
+
+
+def test_aliased_tables_keep_their_alias():
+    sql = "SELECT o.status FROM public.orders AS o WHERE o.id > 1"
+    preview = preview_sql(sql, "postgres", sample_percent=1.0, max_scan_rows=1000)
+
+    assert ") AS o WHERE o.id > 1" in preview.sql
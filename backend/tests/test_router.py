@@ -0,0 +1,23 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from src.agent.nodes.router_nodes import router_node
+from src.agent.state import State
+
+
+def _route(*messages) -> str:
+    state = State(messages=list(messages), database_uri="sqlite://", database_dialect="sqlite", schema_context="")
+    return router_node(state).goto
+
+
+def test_simple_question_takes_the_fast_path():
+    assert _route(HumanMessage(content="How many customers are in Germany")) == "fast_path"
+
+
+def test_follow_up_references_go_to_the_analyst():
+    assert _route(HumanMessage(content="Break that down by month")) == "business_analyst"
+    assert _route(HumanMessage(content="Show this per country")) == "business_analyst"
+
+
+def test_questions_after_a_query_go_to_the_analyst():
+    previous = [HumanMessage(content="How many customers are in Germany"),
+                AIMessage(content="Customers: **42**", name="fast_path")]
+    assert _route(*previous, HumanMessage(content="List customers per country")) == "business_analyst"
@@ -0,0 +1,48 @@
+import json
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from src.agent.tools import tools
+from src.core import llms
+from src.core.admission import FairLimiter
+from src.core.config import config
+from src.core.json_stream import JSONFieldStream
+from src.core.llm_router import LimitedChatModel
+
+SQL = "SELECT country, COUNT(*) AS customers FROM customers WHERE country <> 'Germany' GROUP BY country"
+
+
+def test_dba_model_streams():
+    assert not llms._streaming_disabled(llms.models[config.dba_llm_model])
+
+
+def test_sql_is_sent_in_deltas_while_generated(monkeypatch):
+    fake = GenericFakeChatModel(messages=iter([AIMessage(content=json.dumps({"sql_query": SQL}))]))
+    requested = []
+
+    def get_llm(stream=True, cache=False, model_key=None):
+        requested.append(model_key)
+        return LimitedChatModel(llm=fake, limiter=FairLimiter("llm:test", 1, 1, 1))
+
+    monkeypatch.setattr(tools, "get_llm", get_llm)
+    events = []
+    sql_stream = tools._SQLDeltaHandler(events.append)
+    payload = tools._dba_llm(False, sql_stream).invoke([HumanMessage(content="customers per country")])
+    events.append({"sql_query": payload["sql_query"]})  # sent once the query runs
+    sql_stream.finish(payload["sql_query"])
+
+    assert requested == [config.dba_llm_model]
+    final = events.index({"sql_query": SQL})
+    deltas = [event["sql_query_delta"] for event in events[:final]]
+    assert len(deltas) > 1
+    assert "".join(deltas) == SQL
+    assert events[final + 1:] == []  # nothing left for `finish`
+
+
+def test_json_field_stream_decodes_escapes_split_across_tokens():
+    stream = JSONFieldStream("sql_query")
+    document = json.dumps({"explanation": "ignored \"sql_query\"", "sql_query": 'SELECT "naïve"\nFROM t'})
+    deltas = [stream.feed(document[i:i + 3]) for i in range(0, len(document), 3)]
+
+    assert "".join(deltas) == 'SELECT "naïve"\nFROM t'
+    assert stream.value == 'SELECT "naïve"\nFROM t'
@@ -0,0 +1,36 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from src.agent.nodes.util_nodes import create_parallel_tool_node
+from src.agent.state import State
+from src.core.admission import AdmissionRejected
+
+
+@tool
+def busy_tool(question: str) -> str:
+    """Always rejected by a limiter."""
+    raise AdmissionRejected("db:test", "queue is full")
+
+
+@tool
+def broken_tool(question: str) -> str:
+    """Always fails."""
+    raise ValueError("no such column")
+
+
+def _call(*names):
+    tool_calls = [{"name": name, "args": {"question": "q"}, "id": f"call_{i}", "type": "tool_call"}
+                  for i, name in enumerate(names)]
+    state = State(messages=[HumanMessage(content="q"), AIMessage(content="", tool_calls=tool_calls)],
+                  database_uri="sqlite://", database_dialect="sqlite", schema_context="")
+    return create_parallel_tool_node([busy_tool, broken_tool], max_parallel=2).invoke(state)
+
+
+def test_tool_errors_go_back_to_the_model():
+    message, = _call("broken_tool")["messages"]
+    assert message.status == "error" and "no such column" in message.content
+
+
+def test_admission_rejections_propagate():
+    with pytest.raises(AdmissionRejected):
+        _call("broken_tool", "busy_tool")
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from loadtest import stub_search
+from src.core.web_search import WebSearchClient
+
+
+def _client(transport: httpx.AsyncBaseTransport, ttl_seconds: float = 60) -> WebSearchClient:
+    return WebSearchClient(url="http://search.test/", api_key="stub", timeout=3, max_connections=4,
+                           ttl_seconds=ttl_seconds, max_entries=100, transport=transport)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(stub_search, "SEARCH_MS", 200)
+    monkeypatch.setattr(stub_search, "stats", {"requests": 0})
+    return httpx.ASGITransport(app=stub_search.app)
+
+
+def test_results_are_cached_until_they_expire(stub):
+    client = _client(stub, ttl_seconds=0.3)
+    results = client.search_sync("Latest  SQLite release")
+    assert len(results) == 5 and results[0]["date"] == "2025-01-01"
+
+    assert client.search_sync("latest sqlite release") == results  # same normalized query
+    assert stub_search.stats["requests"] == 1 and client.stats["hits"] == 1
+
+    time.sleep(0.35)
+    client.search_sync("latest sqlite release")
+    assert stub_search.stats["requests"] == 2 and client.stats["misses"] == 2
+
+
+def test_concurrent_identical_searches_share_one_request(stub):
+    client = _client(stub)
+
+    async def search_all():
+        return await asyncio.gather(*(client.search(query) for query in
+                                      ["latest release", "Latest release", "latest  release", "LATEST RELEASE"]))
+
+    results = asyncio.run(search_all())
+    assert all(r == results[0] for r in results)
+    assert stub_search.stats["requests"] == 1
+    assert client.stats["misses"] == 1 and client.stats["deduplicated"] == 3
+
+
+def test_errors_are_counted_and_not_cached():
+    requests = []
+
+    def unavailable(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(503)
+
+    client = _client(httpx.MockTransport(unavailable))
+    assert client.search_sync("latest release") == []
+    assert client.search_sync("latest release") == []
+    assert len(requests) == 2 and client.stats["errors"] == 2
+    assert requests[0].headers["Authorization"] == "Bearer stub" and requests[0].url.params["q"] == "latest release"
+
+
+def test_close_releases_the_pool(stub):
+    client = _client(stub)
+    client.search_sync("latest release")
+    pool = client._client
+
+    client.close()
+    assert pool.is_closed and client._client is None
+    client.close()  # closing twice is fine
+
+    client.search_sync("another release")  # a new pool is opened on demand
+    assert client._client is not None and not client._client.is_closed
+    client.close()